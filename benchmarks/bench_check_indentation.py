@@ -0,0 +1,254 @@
+import io
+import os
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import tracemalloc
+from typing import Optional, Sequence
+
+from fortran_format_hooks.check_indentation import check_indentation, strip_quoted_sections
+
+## Throughput benchmarks for check_indentation and strip_quoted_sections.
+##  Generates synthetic Fortran corpora, one per construct, at a configurable scale, and measures
+##  lines/sec, peak memory and per-line cost for each. Results are written as JSON, and can be compared
+##  against a previous run, failing if any construct has regressed beyond a tolerance.
+##
+## Usage:
+##  python -m benchmarks.bench_check_indentation --output baseline.json
+##  python -m benchmarks.bench_check_indentation --compare baseline.json
+
+
+#-----------------------------------------------------------------------------------------------
+# Synthetic corpora
+#-----------------------------------------------------------------------------------------------
+# Deeply nested modules, procedures, loops and conditionals
+def nested_source(scale):
+    lines = []
+    for m in range(max(1, scale // 50)):
+        lines += [f"module nested_{m}", "  implicit none", "contains"]
+        for p in range(50):
+            lines += [f"  subroutine proc_{m}_{p}(x, n)", "    integer, intent(in) :: n",
+                      "    real, intent(inout) :: x(n)", "    integer :: i, j, k"]
+            lines += ["    outer: do i = 1, n", "       do j = 1, n", "          if (x(i) > x(j)) then",
+                      "             do k = 1, 3", "                x(k) = x(k) + 1.0", "             end do",
+                      "          else if (x(i) < 0.0) then", "             x(i) = 0.0", "          else",
+                      "             block", "               real :: tmp", "               tmp = x(j)",
+                      "             end block", "          end if", "       end do", "    end do outer"]
+            lines += [f"  end subroutine proc_{m}_{p}", ""]
+        lines += [f"end module nested_{m}", ""]
+    return lines
+
+# Long chains of "&" continuation lines, with brackets and assignments spanning them
+def continuation_source(scale):
+    lines = ["module continuation", "  implicit none", "contains", "  subroutine chains(a, b, c)",
+             "    real, intent(inout) :: a(:), b(:), c(:)"]
+    for n in range(scale):
+        lines += ["    a(1) = b(1) + &", "         c(1) * ( b(2) + &", "         c(2) ) + &",
+                  "         sum( [ b(3), &", "         c(3), &", "         a(2) ] ) + &", "         c(4)"]
+        lines += [f"    call update(a, b, &", "         c, &", "         [ 1.0, 2.0, &", "         3.0 ], &",
+                  f"         {n})"]
+    lines += ["  end subroutine chains", "end module continuation", ""]
+    return lines
+
+# select type / select case blocks with many branches
+def select_type_source(scale):
+    lines = ["module selects", "  implicit none", "contains", "  subroutine dispatch(this, n)",
+             "    class(*), intent(in) :: this", "    integer, intent(in) :: n"]
+    for _ in range(scale):
+        lines += ["    select type(this)", "    type is (integer)", "       print *, this",
+                  "    type is (real)", "       print *, this", "    class is (base_type)",
+                  "       call this%run()", "    class default", "       stop 1", "    end select"]
+        lines += ["    select case(n)", "    case(1)", "       print *, 1", "    case(2:5)",
+                  "       print *, 2", "    case default", "       print *, 0", "    end select"]
+    lines += ["  end subroutine dispatch", "end module selects", ""]
+    return lines
+
+# write statements full of quoted strings, escaped quotes and brackets inside strings
+def write_strings_source(scale):
+    lines = ["module writes", "  implicit none", "contains", "  subroutine report(x, unit)",
+             "    real, intent(in) :: x", "    integer, intent(in) :: unit"]
+    for _ in range(scale):
+        lines += ["    write(unit,'(\"Value of x (in [units]): \",F8.3,\" it''s ok\")') x",
+                  "    write(unit,*) \"a \"\"quoted\"\" (string) with [brackets]\", &",
+                  "         'and ''another'' one (', x, ')'",
+                  "    write(unit,'(A)') 'plain string with ! not a comment'",
+                  "    print *, \"status: (\", 'ok', \")\" ! trailing comment",
+                  "    write(unit,'(A)') 'continued string &",
+                  "         &over two lines'"]
+    lines += ["  end subroutine report", "end module writes", ""]
+    return lines
+
+# Preprocessor-heavy source, as found in .F90 files
+def preprocessor_source(scale):
+    lines = ["module preprocessed", "#ifdef USE_MPI", "  use mpi", "#endif", "  implicit none",
+             "contains", "  subroutine run(x)", "    real, intent(inout) :: x"]
+    for n in range(scale):
+        lines += ["#ifdef USE_MPI", f"    call mpi_barrier(comm_{n}, ierr)", "#else",
+                  "    x = x + 1.0", "#endif", "#if defined(_OPENMP) && OMP_LEVEL > 1",
+                  "    !$omp parallel do", "    do i = 1, 10", "       x = x * 2.0", "    end do",
+                  "    !$omp end parallel do", "#endif", f"#define KERNEL_{n} 1"]
+    lines += ["  end subroutine run", "end module preprocessed", ""]
+    return lines
+
+CONSTRUCTS = {
+    'nested': ('.f90', nested_source),
+    'continuation': ('.f90', continuation_source),
+    'select_type': ('.f90', select_type_source),
+    'write_strings': ('.f90', write_strings_source),
+    'preprocessor': ('.F90', preprocessor_source),
+}
+
+
+# Write the corpus for a construct, indented as check_indentation expects, returning its path
+def write_corpus(directory, construct, scale):
+    extension, source = CONSTRUCTS[construct]
+    path = os.path.join(directory, construct + extension)
+    with open(path, 'w', encoding='UTF-8') as f:
+        f.write("\n".join(source(scale)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, corrected_code = check_indentation(path)
+    if corrected_code is not None:
+        with open(path, 'w', encoding='UTF-8') as f:
+            f.write(corrected_code)
+    return path
+
+
+#-----------------------------------------------------------------------------------------------
+# Measurements
+#-----------------------------------------------------------------------------------------------
+def _best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _check_quietly(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        check_indentation(path)
+
+def _strip_all(lines):
+    in_single_quote = in_double_quote = False
+    for line in lines:
+        _, in_single_quote, in_double_quote = strip_quoted_sections(line, in_single_quote, in_double_quote)
+
+def measure(path, repeat):
+    with open(path, 'r') as f:
+        lines = [line.rstrip() for line in f]
+    num_lines = len(lines)
+
+    check_time = _best_time(lambda: _check_quietly(path), repeat)
+    strip_time = _best_time(lambda: _strip_all(lines), repeat)
+
+    tracemalloc.start()
+    _check_quietly(path)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'lines': num_lines,
+        'bytes': os.path.getsize(path),
+        'check_indentation': {
+            'seconds': check_time,
+            'lines_per_second': num_lines / check_time,
+            'microseconds_per_line': 1e6 * check_time / num_lines,
+            'peak_memory_bytes': peak_memory,
+        },
+        'strip_quoted_sections': {
+            'seconds': strip_time,
+            'lines_per_second': num_lines / strip_time,
+            'microseconds_per_line': 1e6 * strip_time / num_lines,
+        },
+    }
+
+
+# Compare results against a baseline, returning a description of each regression
+def compare(results, baseline, tolerance):
+    regressions = []
+    for construct, result in results['constructs'].items():
+        base = baseline.get('constructs', {}).get(construct)
+        if base is None:
+            continue
+        for function in ('check_indentation', 'strip_quoted_sections'):
+            current_speed = result[function]['lines_per_second']
+            baseline_speed = base[function]['lines_per_second']
+            if current_speed < baseline_speed * (1 - tolerance):
+                regressions.append(
+                    f"{construct}: {function} {current_speed:,.0f} lines/s, "
+                    f"baseline {baseline_speed:,.0f} lines/s ({current_speed / baseline_speed - 1:+.1%})"
+                )
+        current_memory = result['check_indentation']['peak_memory_bytes']
+        baseline_memory = base['check_indentation']['peak_memory_bytes']
+        if current_memory > baseline_memory * (1 + tolerance):
+            regressions.append(
+                f"{construct}: check_indentation peak memory {current_memory:,} bytes, "
+                f"baseline {baseline_memory:,} bytes ({current_memory / baseline_memory - 1:+.1%})"
+            )
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark check_indentation on synthetic Fortran corpora.')
+    parser.add_argument(
+        '--scale', type=int, default=500,
+        help='Number of repetitions of each construct in its corpus.',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of timed runs, of which the fastest is kept.',
+    )
+    parser.add_argument(
+        '--constructs', nargs='*', choices=sorted(CONSTRUCTS), default=sorted(CONSTRUCTS),
+        help='Constructs to benchmark.',
+    )
+    parser.add_argument(
+        '--output',
+        help='Write the results to this JSON file.',
+    )
+    parser.add_argument(
+        '--compare',
+        help='Compare against the results in this JSON file, failing on regressions.',
+    )
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help='Allowed slowdown or memory growth before a regression is reported (0.1 = 10%%).',
+    )
+    args = parser.parse_args(argv)
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'constructs': {},
+    }
+    print(f"{'construct':<15}{'lines':>9}{'check lines/s':>16}{'us/line':>10}{'peak MiB':>10}{'strip lines/s':>16}")
+    with tempfile.TemporaryDirectory() as directory:
+        for construct in args.constructs:
+            result = measure(write_corpus(directory, construct, args.scale), args.repeat)
+            results['constructs'][construct] = result
+            check, strip = result['check_indentation'], result['strip_quoted_sections']
+            print(f"{construct:<15}{result['lines']:>9}{check['lines_per_second']:>16,.0f}"
+                  f"{check['microseconds_per_line']:>10.2f}{check['peak_memory_bytes'] / 2**20:>10.2f}"
+                  f"{strip['lines_per_second']:>16,.0f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='UTF-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='UTF-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
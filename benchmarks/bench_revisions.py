@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from typing import Optional, Sequence
+
+from benchmarks.bench_check_indentation import CONSTRUCTS, write_corpus
+
+## Compare check_indentation across git revisions on the same synthetic corpora.
+##  The package of each revision is extracted with git archive into a scratch directory and timed in its own
+##  interpreter, so revisions that predate this suite, or whose check_indentation differs in anything but its
+##  signature, can be compared against each other, e.g. the keyword dispatch against the regex cascade before it.
+##
+## Usage:
+##  python -m benchmarks.bench_revisions 941c461~1 941c461
+##  python -m benchmarks.bench_revisions HEAD~5 HEAD --scale 2000 --output revisions.json
+
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the interpreter of each revision: the best time of check_indentation on each corpus given, as JSON
+TIMER = """
+import io, sys, json, time, contextlib
+from fortran_format_hooks import check_indentation as module
+from fortran_format_hooks.check_indentation import check_indentation
+repeat, paths = int(sys.argv[1]), sys.argv[2:]
+times = {'module': module.__file__}
+for path in paths:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            check_indentation(path)
+        best = min(best, time.perf_counter() - start)
+    times[path] = best
+print(json.dumps(times))
+"""
+
+
+# Extract the package as it is at a revision into directory
+def extract(revision, directory):
+    archive = subprocess.run(
+        ['git', 'archive', '--format=tar', revision, 'fortran_format_hooks'],
+        cwd=PACKAGE_ROOT, stdout=subprocess.PIPE, check=True,
+    ).stdout
+    subprocess.run(['tar', '-x', '-C', directory], input=archive, check=True)
+
+# Best time of check_indentation on each corpus at a revision, in seconds
+def measure(revision, paths, repeat, directory):
+    os.makedirs(directory)
+    extract(revision, directory)
+    ## run from the scratch directory, as python -c imports from the current directory before PYTHONPATH
+    output = subprocess.run(
+        [sys.executable, '-c', TIMER, str(repeat), *paths],
+        cwd=directory, env=dict(os.environ, PYTHONPATH=directory), stdout=subprocess.PIPE, text=True, check=True,
+    ).stdout
+    times = json.loads(output)
+    if not os.path.realpath(times.pop('module')).startswith(os.path.realpath(directory)):
+        raise RuntimeError(f"the package of {revision} was not the one imported")
+    return times
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Compare check_indentation across git revisions.')
+    parser.add_argument(
+        'revisions', nargs='+',
+        help='Git revisions to compare, the first being the baseline.',
+    )
+    parser.add_argument(
+        '--scale', type=int, default=500,
+        help='Number of repetitions of each construct in its corpus.',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of timed runs, of which the fastest is kept.',
+    )
+    parser.add_argument(
+        '--constructs', nargs='*', choices=sorted(CONSTRUCTS), default=sorted(CONSTRUCTS),
+        help='Constructs to benchmark.',
+    )
+    parser.add_argument(
+        '--output',
+        help='Write the results to this JSON file.',
+    )
+    args = parser.parse_args(argv)
+
+    results = {'scale': args.scale, 'revisions': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {construct: write_corpus(directory, construct, args.scale) for construct in args.constructs}
+        lines = {}
+        for construct, path in paths.items():
+            with open(path, 'r', encoding='UTF-8') as f:
+                lines[construct] = sum(1 for _ in f)
+        for number, revision in enumerate(args.revisions):
+            times = measure(revision, list(paths.values()), args.repeat, os.path.join(directory, f'revision_{number}'))
+            results['revisions'][revision] = {construct: times[path] for construct, path in paths.items()}
+
+    baseline = args.revisions[0]
+    print(f"{'construct':<15}{'lines':>9}" + "".join(f"{revision[:14]:>16}" for revision in args.revisions))
+    for construct in args.constructs + ['total']:
+        if construct == 'total':
+            times = [sum(results['revisions'][revision].values()) for revision in args.revisions]
+            line_count = sum(lines.values())
+        else:
+            times = [results['revisions'][revision][construct] for revision in args.revisions]
+            line_count = lines[construct]
+        print(f"{construct:<15}{line_count:>9}" + "".join(f"{time:>15.3f}s" for time in times))
+    base_total = sum(results['revisions'][baseline].values())
+    for revision in args.revisions[1:]:
+        total = sum(results['revisions'][revision].values())
+        print(f"{revision}: {total:.3f}s against {base_total:.3f}s for {baseline} ({base_total / total:.2f}x)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='UTF-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Optional, Sequence
+
+## Startup benchmark for the check-fortran-indentation hook.
+##  Runs the hook entry point in fresh interpreters, as pre-commit does, and measures the wall time of each run
+##  over that of a bare interpreter, along with the import time reported by python -X importtime and the
+##  modules of the package imported. The case without Fortran files, which pre-commit runs on most commits,
+##  must stay within a budget of a few milliseconds over the interpreter.
+##
+## Usage:
+##  python -m benchmarks.bench_startup
+##  python -m benchmarks.bench_startup --budget 5 --output startup.json
+
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Same as the console script installed for the hook
+HOOK = "import sys; from fortran_format_hooks.hook import main; sys.exit(main())"
+
+SOURCE = "program startup\n  implicit none\n  integer :: i\n  do i = 1, 3\n     print *, i\n  end do\nend program startup\n"
+
+
+# Command line of each case, given a directory holding a Fortran file
+def cases(directory):
+    fortran_file = os.path.join(directory, 'startup.f90')
+    other_files = [os.path.join(PACKAGE_ROOT, 'setup.cfg'), os.path.join(PACKAGE_ROOT, 'LICENSE')]
+    return {
+        'interpreter': ['-c', 'pass'],
+        'no-files': ['-c', HOOK, '--line-length', '100', *other_files],
+        'one-file': ['-c', HOOK, '--no-cache', fortran_file, *other_files],
+    }
+
+
+#-----------------------------------------------------------------------------------------------
+# Measurements
+#-----------------------------------------------------------------------------------------------
+def _run(arguments, env):
+    return subprocess.run(
+        [sys.executable, *arguments], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+
+# Sorted times of the runs of a command, in seconds
+def _times(arguments, env, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _run(arguments, env)
+        times.append(time.perf_counter() - start)
+    return sorted(times)
+
+# Total import time (in microseconds) and the modules of the package imported, from python -X importtime
+def _imports(arguments, env):
+    stderr = _run(['-X', 'importtime', *arguments], env).stderr
+    total = 0
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        ## modules imported at the top level are indented by one space, and their time includes those they import
+        if not name.startswith('  '):
+            total += int(cumulative)
+        if name.strip().startswith('fortran_format_hooks'):
+            modules.append(name.strip())
+    return total, modules
+
+def measure(arguments, env, repeat):
+    times = _times(arguments, env, repeat)
+    import_time, modules = _imports(arguments, env)
+    return {
+        'best_seconds': times[0],
+        'median_seconds': times[len(times) // 2],
+        'import_microseconds': import_time,
+        'package_modules': modules,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the startup of the check-fortran-indentation hook.')
+    parser.add_argument(
+        '--repeat', type=int, default=20,
+        help='Number of timed runs of each case, of which the median is kept.',
+    )
+    parser.add_argument(
+        '--budget', type=float, default=5.0,
+        help='Milliseconds the case without Fortran files may take over a bare interpreter.',
+    )
+    parser.add_argument(
+        '--output',
+        help='Write the results to this JSON file.',
+    )
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (PACKAGE_ROOT, os.environ.get('PYTHONPATH')))))
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cases': {},
+    }
+    print(f"{'case':<13}{'median ms':>11}{'overhead ms':>13}{'imports ms':>12}  package modules")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'startup.f90'), 'w', encoding='UTF-8') as f:
+            f.write(SOURCE)
+        for case, arguments in cases(directory).items():
+            result = measure(arguments, env, args.repeat)
+            result['overhead_seconds'] = (
+                result['median_seconds'] - results['cases']['interpreter']['median_seconds']
+                if case != 'interpreter' else 0.0
+            )
+            results['cases'][case] = result
+            print(f"{case:<13}{result['median_seconds'] * 1e3:>11.2f}{result['overhead_seconds'] * 1e3:>13.2f}"
+                  f"{result['import_microseconds'] / 1e3:>12.2f}  {len(result['package_modules'])}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='UTF-8') as f:
+            json.dump(results, f, indent=2)
+
+    overhead = results['cases']['no-files']['overhead_seconds'] * 1e3
+    if overhead > args.budget:
+        print(f"Over budget: the hook takes {overhead:.2f} ms over the interpreter without Fortran files, "
+              f"budget {args.budget:.2f} ms")
+        return 1
+    print(f"Within budget: {overhead:.2f} ms over the interpreter without Fortran files.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+import os
+import time
+import sqlite3
+import hashlib
+
+## Persistent cache of check results, so that files whose contents (and the options they were
+##  checked with) have not changed since the last run can be skipped.
+##  It also keeps checkpoints of the state of the check part way through files, so checking only the changed
+##  lines of a file can resume close to them.
+
+
+DEFAULT_MAX_ENTRIES = 50000
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    filename TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    output TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (filename, digest, fingerprint)
+)
+'''
+
+_CHECKPOINT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS checkpoints (
+    filename TEXT NOT NULL,
+    options TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    checkpoints BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (filename, options, fingerprint)
+)
+'''
+
+
+def default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'fortran-format-hooks')
+
+# Hash the raw contents of a file
+def file_digest(filename):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Fingerprint of everything other than the file contents that affects a check result
+def options_fingerprint(*options):
+    return hashlib.blake2b(repr(options).encode('UTF-8'), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, cache_dir, fingerprint, max_entries=DEFAULT_MAX_ENTRIES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self._connection = sqlite3.connect(os.path.join(cache_dir, 'results.sqlite3'), timeout=30)
+        self._connection.execute(_SCHEMA)
+        self._connection.execute(_CHECKPOINT_SCHEMA)
+        self._used = []
+
+    def lookup(self, filename, digest):
+        row = self._connection.execute(
+            'SELECT success, output FROM results WHERE filename = ? AND digest = ? AND fingerprint = ?',
+            (filename, digest, self.fingerprint)
+        ).fetchone()
+        if row is None:
+            return None
+        self._used.append((filename, digest))
+        return bool(row[0]), row[1]
+
+    def store(self, filename, digest, success, output):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+            (filename, digest, self.fingerprint, int(success), output, time.time())
+        )
+
+    # The checkpoints stored for a file checked with options (a fingerprint of them), or None
+    def lookup_checkpoints(self, filename, options):
+        row = self._connection.execute(
+            'SELECT checkpoints FROM checkpoints WHERE filename = ? AND options = ? AND fingerprint = ?',
+            (filename, options, self.fingerprint)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def store_checkpoints(self, filename, options, checkpoints):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)',
+            (filename, options, self.fingerprint, checkpoints, time.time())
+        )
+
+    # Record the entries used in this run and evict the least recently used beyond max_entries
+    def close(self):
+        with self._connection:
+            now = time.time()
+            self._connection.executemany(
+                'UPDATE results SET last_used = ? WHERE filename = ? AND digest = ? AND fingerprint = ?',
+                [(now, filename, digest, self.fingerprint) for filename, digest in self._used]
+            )
+            self._connection.execute(
+                'DELETE FROM results WHERE rowid IN '
+                '(SELECT rowid FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            self._connection.execute(
+                'DELETE FROM checkpoints WHERE rowid IN '
+                '(SELECT rowid FROM checkpoints ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+        self._connection.close()
@@ -1,458 +1,1643 @@
+import io
 import os
+import json
 import re
 import sys
+import time
 import glob
+import filecmp
+import sqlite3
+import tempfile
 import argparse
+import bisect
+import functools
 from typing import Optional, Sequence
 
+from fortran_format_hooks import cache
+from fortran_format_hooks import lexer
+from fortran_format_hooks import fixes
+from fortran_format_hooks import hook
+from fortran_format_hooks import profiling
+from fortran_format_hooks import source
+from fortran_format_hooks import reporters
+from fortran_format_hooks import scopes
+from fortran_format_hooks import styles
+from fortran_format_hooks import summary
+
 ## Attribution statement:
 ##  Some of the functionality in this file is based on the pre-commit/pre-commit-hooks repository
 ##  https://github.com/pre-commit/pre-commit-hooks/blob/main/pre_commit_hooks
 
 
-# Function to fix the indentation of the file
-# Copied from pre-commit/pre-commit-hooks repository
-# https://github.com/pre-commit/pre-commit-hooks/blob/main/pre_commit_hooks/pretty_format_json.py
-def _autofix(filename: str, new_contents: str) -> None:
-    print(f'Fixing file {filename}')
-    with open(filename, 'w', encoding='UTF-8') as f:
-        f.write(new_contents)
-
-def check_if_match(actual_indent, expected_indent, continued_indent, continuation_line, line_num, file_path):
+# Indentation widths
+PROCEDURE_INDENT = 2
+MODULE_PROGRAM_INDENT = 2
+LOOP_CONDITIONAL_INDENT = 3
+CONTINUATION_INDENT = 5
+CHECKPOINT_INTERVAL = 100  # Lines between the checkpoints kept of files checked by their changed lines
+
+# Style used where no other is configured (see styles.py)
+DEFAULT_STYLE = styles.Style(
+    procedure_indent=PROCEDURE_INDENT,
+    module_program_indent=MODULE_PROGRAM_INDENT,
+    loop_conditional_indent=LOOP_CONDITIONAL_INDENT,
+    continuation_indent=CONTINUATION_INDENT,
+    line_length=80,
+    relaxed_line_margin=0.1,
+)
+
+#-----------------------------------------------------------------------------------------------
+# Precompiled statement patterns
+#-----------------------------------------------------------------------------------------------
+# Leading keyword of a statement, and the keyword following an optional "NAME:" construct label
+_LEADING_KEYWORD_RE = re.compile(r'\s*(\w*)(?:\s*:\s*(\w+))?')
+
+_COMMENT_LINE_RE = re.compile(r'^\s*!')
+_LEADING_AMPERSAND_RE = re.compile(r'^\s*&')
+_CLOSE_BRACKET_RE = re.compile(r'^\s*(\)|/\)|\])')
+_TRAILING_COMMENT_RE = re.compile(r'!.*')
+_EQUALITY_CONTINUATION_RE = re.compile(r'=\s*&$')
+_COMMA_CONTINUATION_RE = re.compile(r',\s*&$')
+
+# Text up to the next quote, and the rest of a quoted section up to and including its closing quote (if any)
+_UNQUOTED_RE = re.compile(r'[^\'"]*')
+_SINGLE_QUOTED_RE = re.compile(r"[^']*(?:''[^']*)*(')?")
+_DOUBLE_QUOTED_RE = re.compile(r'[^"]*(?:""[^"]*)*(")?')
+
+_END_BLOCK_RE = re.compile(
+    r'^\s*end\s*(do|if|where|select|block|associate|interface|type|function|subroutine|procedure|submodule|module|program)\b',
+    re.IGNORECASE
+)
+_CASE_RE = re.compile(r'^\s*(case|class is|type is|rank)\s*\(', re.IGNORECASE)
+_CASE_DEFAULT_RE = re.compile(r'^\s*(case|class|rank)\s+default\b', re.IGNORECASE)
+
+_MODULE_RE = re.compile(r'^\s*module\b(?!\s+(recursive|procedure|function|subroutine))', re.IGNORECASE)
+_SUBMODULE_PROGRAM_RE = re.compile(r'^\s*(submodule|program)\b', re.IGNORECASE)
+_PROCEDURE_RE = re.compile(
+    r'^\s*(integer\s+|logical\s+)?(elemental\s+|recursive\s+|pure\s+)?(module\s+)?(recursive\s+)?(function|subroutine|procedure)\b',
+    re.IGNORECASE
+)
+_PROCEDURE_ATTRIBUTE_RE = re.compile(r'^\s*(function|subroutine|procedure)\s*(,|::)', re.IGNORECASE)
+_PROCEDURE_INTERFACE_RE = re.compile(r'^\s*procedure\s*(\(|\,)', re.IGNORECASE)
+_MODULE_PROCEDURE_RE = re.compile(r'^\s*(module\s+)?procedure\b', re.IGNORECASE)
+_DERIVED_TYPE_RE = re.compile(r'^\s*type\s*(::|,)', re.IGNORECASE)
+_INTERFACE_RE = re.compile(r'^\s*(abstract\s+)?interface\b', re.IGNORECASE)
+_ASSOCIATE_RE = re.compile(r'^\s*associate\b', re.IGNORECASE)
+_BLOCK_RE = re.compile(r'^\s*(?:\w+\s*:\s*)?block\b', re.IGNORECASE)
+_LOOP_RE = re.compile(r'^\s*(?:\w+\s*:\s*)?(do|where)\b', re.IGNORECASE)
+_DO_CONCURRENT_RE = re.compile(r'^\s*(?:\w+\s*:\s*)?do\s+concurrent\b', re.IGNORECASE)
+_IF_THEN_RE = re.compile(r'^\s*(?:\w*\s*:\s*)?if\s*\(.*\)\s*then\b', re.IGNORECASE)
+_IF_RE = re.compile(r'^\s*(?:\w+\s*:\s*)?(if)\b', re.IGNORECASE)
+_SELECT_RE = re.compile(r'^\s*(?:\w+\s*:\s*)?select\s+(type|case|rank)\b', re.IGNORECASE)
+_READWRITE_RE = re.compile(r'^\s*(read|write)\s*\(', re.IGNORECASE)
+
+# Fixed-form statements: labelled do loops, the statements that can end them, and a bare program unit end
+_LABELLED_DO_RE = re.compile(r'^\s*(?:\w+\s*:\s*)?do\s*(\d+)', re.IGNORECASE)
+_LOOP_TERMINAL_RE = re.compile(r'^\s*(continue|end\s*do)\b', re.IGNORECASE)
+_BARE_END_RE = re.compile(r'^\s*end\s*$', re.IGNORECASE)
+
+# Preprocessor conditionals, whose branches are each checked from the state at the start of the conditional
+_CONDITIONAL_DIRECTIVE_RE = re.compile(r'^\s*#\s*(if|ifdef|ifndef|elif|else|endif)\b')
+
+# Indentation group closed by each "end" statement
+_END_BLOCK_KINDS = {
+    'do': 'loop_conditional', 'if': 'loop_conditional', 'where': 'loop_conditional',
+    'select': 'loop_conditional',
+    'block': 'block',
+    'associate': 'associate',
+    'interface': 'interface',
+    'type': 'derived_type',
+    'function': 'procedure', 'subroutine': 'procedure', 'procedure': 'procedure',
+    'submodule': 'module_program', 'module': 'module_program', 'program': 'module_program',
+}
+
+# Leading keywords that can close (or temporarily dedent) the current block
+_ELSE_KEYWORDS = frozenset(('else', 'elseif', 'elsewhere'))
+_CASE_KEYWORDS = frozenset(('case', 'class', 'type', 'rank'))
+
+# Rules that can open a block, keyed by the leading keyword of the statement
+_OPENING_RULES = {
+    'module': frozenset(('module_program', 'procedure')),
+    'submodule': frozenset(('module_program',)),
+    'program': frozenset(('module_program',)),
+    'integer': frozenset(('procedure',)),
+    'logical': frozenset(('procedure',)),
+    'elemental': frozenset(('procedure',)),
+    'recursive': frozenset(('procedure',)),
+    'pure': frozenset(('procedure',)),
+    'function': frozenset(('procedure',)),
+    'subroutine': frozenset(('procedure',)),
+    'procedure': frozenset(('procedure',)),
+    'type': frozenset(('derived_type',)),
+    'abstract': frozenset(('interface',)),
+    'interface': frozenset(('interface',)),
+    'associate': frozenset(('associate',)),
+    'block': frozenset(('block',)),
+    'do': frozenset(('loop', 'do_concurrent')),
+    'where': frozenset(('loop',)),
+    'if': frozenset(('if_then', 'if')),
+    'select': frozenset(('select',)),
+    'read': frozenset(('readwrite',)),
+    'write': frozenset(('readwrite',)),
+}
+
+# Rules for constructs that may be preceded by a "NAME:" label
+_LABELLED_OPENING_RULES = {
+    'block': frozenset(('block',)),
+    'do': frozenset(('loop', 'do_concurrent')),
+    'where': frozenset(('loop',)),
+    'if': frozenset(('if_then', 'if')),
+    'select': frozenset(('select',)),
+}
+
+_NO_RULES = frozenset()
+
+
+def _leading_keywords(line):
+    match = _LEADING_KEYWORD_RE.match(line)
+    return match.group(1).lower(), (match.group(2) or '').lower()
+
+def _opening_rules(line):
+    keyword, label_keyword = _leading_keywords(line)
+    rules = _OPENING_RULES.get(keyword, _NO_RULES)
+    if label_keyword in _LABELLED_OPENING_RULES:
+        rules = rules | _LABELLED_OPENING_RULES[label_keyword]
+    return rules
+
+
+# Stream corrected lines into a temporary file in the same directory as the original
+# A symbolic link is followed, so the file is staged next to (and later replaces) the file the link points to
+# Returns the result of the check that produced the lines, the number of lines and the path of the temporary file
+def _stage_autofix(filename, corrected_lines):
+    target = os.path.realpath(filename)
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(target), prefix=f'.{os.path.basename(target)}.', suffix='.tmp'
+    )
+    try:
+        with open(fd, 'w', encoding='UTF-8') as f:
+            result, line_count = _drain(corrected_lines, f.write)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return result, line_count, temp_path
+
+# Compare corrected lines with the lines of the file they correct
+# Returns the result of the check that produced the lines, the number of lines and their unified diff
+def _stage_diff(filename, corrected_lines):
+    with open(filename, 'r', encoding=source.ENCODING, newline='') as original_lines:
+        differ = fixes.LineDiff(filename, original_lines)
+        result, line_count = _drain(corrected_lines, differ.write)
+        return result, line_count, differ.close()
+
+def _indentation_diagnostic(actual_indent, expected_indent, continued_indent, continuation_line, line_num, file_path):
     if continuation_line:
         if actual_indent != continued_indent:
-            print(f"Indentation error in {file_path}, line {line_num}: "
-                f"Expected {continued_indent} spaces, found {actual_indent}")
-            return False
+            return Diagnostic(file_path, line_num, 'indentation', continued_indent, actual_indent)
     else:
         if actual_indent != expected_indent:
-            print(f"Indentation error in {file_path}, line {line_num}: "
-                f"Expected {expected_indent} spaces, found {actual_indent}")
-            return False
+            return Diagnostic(file_path, line_num, 'indentation', expected_indent, actual_indent)
+    return None
+
+def check_if_match(actual_indent, expected_indent, continued_indent, continuation_line, line_num, file_path):
+    diagnostic = _indentation_diagnostic(actual_indent, expected_indent, continued_indent, continuation_line, line_num, file_path)
+    if diagnostic:
+        print(diagnostic)
+        return False
     return True
 
-def correct_lines(corrected_lines, stripped_line, expected_indent, continuation_line, continued_indent):
+def corrected_line(stripped_line, expected_indent, continuation_line, continued_indent):
     if continuation_line:
-        corrected_lines.append( " " * continued_indent + stripped_line.lstrip() )
+        return " " * continued_indent + stripped_line.lstrip()
     else:
-        corrected_lines.append( " " * expected_indent + stripped_line.lstrip() )
+        return " " * expected_indent + stripped_line.lstrip()
 
-def strip_quoted_sections(line, in_single_quote=False, in_double_quote=False):
-    result = []
-    i = 0
-    quote_char = None
-
-    while i < len(line):
-        char = line[i]
-
-        if not in_single_quote and not in_double_quote:
-            if char == "'":
-                in_single_quote = True
-                quote_char = "'"
-                i += 1
-                continue
-            elif char == '"':
-                in_double_quote = True
-                quote_char = '"'
-                i += 1
-                continue
-            else:
-                result.append(char)
-        elif in_single_quote:
-            if char == "'" and (i + 1 >= len(line) or line[i + 1] != "'"):
-                in_single_quote = False
-                quote_char = None
-            elif char == "'" and line[i + 1] == "'":  # Escaped quote
-                i += 1  # skip next quote
-        elif in_double_quote:
-            if char == '"' and (i + 1 >= len(line) or line[i + 1] != '"'):
-                in_double_quote = False
-                quote_char = None
-            elif char == '"' and line[i + 1] == '"':  # Escaped quote
-                i += 1  # skip next quote
-        i += 1
-
-    return ''.join(result), in_single_quote, in_double_quote
-
-def check_indentation(file_path, line_length=80, relaxed_line_margin=0.1):
-    corrected_lines = []
-    procedure_indent = 2
-    module_program_indent = 2
-    loop_conditional_indent = 3
-    continuation_indent = 5
-
-    inside_module_program = False
-    procedure_depth = 0
-    inside_loop_conditional = False
-    inside_select = False
-    specifier_line = False
-    inside_derived_type = False
-    on_continued_if_line = False
-    on_continued_loop_line = False
-    on_continued_case_line = False
-    inside_procedure_arguments = False
-    inside_associate_arguments = False
-    inside_do_concurrent_limits = False
-    interface_block = False
-
-    readwrite_argument_line = False
-    readwrite_statement_line = False
-
-    expected_indent = 0  # Default expected indentation
-    continuation_line = False  # Flag to indicate if the previous line was a continuation
-    open_bracket_count = 0  # Count of unbalanced open brackets
-    close_bracket_count = 0  # Count of unbalanced close brackets
-    unbalanced_brackets = 0
-    continued_indent = 0
-    num_single_quotes = 0
-    num_double_quotes = 0
-    unbalanced_quotes = False
-    equality_depth = 0
-    equality_brackets = []
-    in_single_quote = False
-    in_double_quote = False
-
-    success = True
-
-    relaxed_line_length = int(line_length * relaxed_line_margin)
+def correct_lines(corrected_lines, stripped_line, expected_indent, continuation_line, continued_indent):
+    corrected_lines.append( corrected_line(stripped_line, expected_indent, continuation_line, continued_indent) )
+
+# Write the lines produced by a generator of corrected lines, joined by newlines
+# Returns the value returned by the generator and the number of lines it produced
+def _drain(lines, write=None):
+    separator = ""
+    line_count = 0
+    while True:
+        try:
+            line = next(lines)
+        except StopIteration as stop:
+            return stop.value, line_count
+        line_count += 1
+        if write:
+            write(separator + line)
+            separator = "\n"
 
-    with open(file_path, 'r') as file:
-        for line_num, line in enumerate(file, start=1):
-            
-            
+def strip_quoted_sections(line, in_single_quote=False, in_double_quote=False):
+    unquoted, in_single_quote, in_double_quote, _ = scan_quoted_sections(line, in_single_quote, in_double_quote)
+    return unquoted, in_single_quote, in_double_quote
+
+# Remove the quoted sections of a line, in one pass over it
+# Quotes are escaped by doubling them, and a quoted section left open at the end of the line continues
+# on the next line, so the quote state is taken from and returned for the next line
+# Returns the unquoted text, the quote state after the line, and the net count of brackets opened by it
+def scan_quoted_sections(line, in_single_quote=False, in_double_quote=False):
+    if not in_single_quote and not in_double_quote and "'" not in line and '"' not in line:
+        return line, False, False, _bracket_delta(line)
+
+    pieces = []
+    position = 0
+    if in_single_quote or in_double_quote:
+        match = (_SINGLE_QUOTED_RE if in_single_quote else _DOUBLE_QUOTED_RE).match(line)
+        if not match.group(1):
+            return '', in_single_quote, in_double_quote, 0
+        position = match.end()
+    while True:
+        match = _UNQUOTED_RE.match(line, position)
+        pieces.append(match.group())
+        position = match.end()
+        if position == len(line):
+            unquoted = ''.join(pieces)
+            return unquoted, False, False, _bracket_delta(unquoted)
+        quote = line[position]
+        match = (_SINGLE_QUOTED_RE if quote == "'" else _DOUBLE_QUOTED_RE).match(line, position + 1)
+        if not match.group(1):
+            unquoted = ''.join(pieces)
+            return unquoted, quote == "'", quote == '"', _bracket_delta(unquoted)
+        position = match.end()
+
+def _bracket_delta(text):
+    return text.count('(') + text.count('[') - text.count(')') - text.count(']')
+
+#-----------------------------------------------------------------------------------------------
+# Diagnostics
+#-----------------------------------------------------------------------------------------------
+# Description of the problem found by each rule, and how it is reported with its location
+_DIAGNOSTIC_FORMATS = {
+    'indentation': (
+        "Expected {expected} spaces, found {found}",
+        "Indentation error in {file_path}, line {line_num}: Expected {expected} spaces, found {found}",
+    ),
+    'comment-line-length': (
+        "Comment line exceeds {expected} characters: {found}",
+        "Comment Line {line_num} in {file_path} exceeds {expected} characters: {found}",
+    ),
+    'line-length': (
+        "Line exceeds hard limit {expected} characters: {found}",
+        "Line {line_num} in {file_path} exceeds hard limit {expected} characters: {found}",
+    ),
+    'relaxed-line-length': (
+        "Line exceeds {expected} characters: {found}, but within 10% of limit",
+        "Note: Line {line_num} in {file_path} exceeds {expected} characters: {found}, but within 10% of limit",
+    ),
+    'unbalanced-quotes': (
+        "Unbalanced quotes",
+        "Unbalanced quotes in {file_path}, line {line_num}",
+    ),
+    'fixed-line-length': (
+        "Code extends past column {expected}: {found}",
+        "Line {line_num} in {file_path} extends past column {expected}: {found}",
+    ),
+    'label-field': (
+        "Label field contains {found!r}, not a statement label",
+        "Label error in {file_path}, line {line_num}: label field contains {found!r}, not a statement label",
+    ),
+    'unreadable': (
+        "Could not read the file: {found}",
+        "Could not read {file_path}: {found}",
+    ),
+    'unwritable': (
+        "Could not write the fix: {found}",
+        "Could not write the fix of {file_path}: {found}",
+    ),
+}
+
+# Severity of the problem found by each rule: errors fail the check, warnings and notes do not
+_SEVERITIES = {
+    'indentation': 'error',
+    'line-length': 'error',
+    'unbalanced-quotes': 'error',
+    'label-field': 'error',
+    'unreadable': 'error',
+    'unwritable': 'error',
+    'comment-line-length': 'warning',
+    'fixed-line-length': 'warning',
+    'relaxed-line-length': 'note',
+}
+
+
+# A problem found on one line of a file, which prints as it is reported by the hook
+class Diagnostic:
+    __slots__ = ('file_path', 'line_num', 'rule', 'expected', 'found')
+
+    def __init__(self, file_path, line_num, rule, expected=None, found=None):
+        self.file_path = file_path
+        self.line_num = line_num
+        self.rule = rule
+        self.expected = expected
+        self.found = found
+
+    # Description of the problem, without its location
+    @property
+    def message(self):
+        return _DIAGNOSTIC_FORMATS[self.rule][0].format(expected=self.expected, found=self.found)
+
+    @property
+    def severity(self):
+        return _SEVERITIES[self.rule]
+
+    def as_dict(self):
+        return {
+            'file': self.file_path,
+            'line': self.line_num,
+            'rule': self.rule,
+            'severity': self.severity,
+            'message': self.message,
+            'expected': self.expected,
+            'found': self.found,
+        }
+
+    # Copy of the diagnostic moved by a number of lines
+    def moved(self, line_offset):
+        return Diagnostic(self.file_path, self.line_num + line_offset, self.rule, self.expected, self.found)
+
+    def __str__(self):
+        text = _DIAGNOSTIC_FORMATS[self.rule][1].format(
+            file_path=self.file_path, line_num=self.line_num, expected=self.expected, found=self.found
+        )
+        # unbalanced quotes found at the start of a line are reported with the line
+        if self.rule == 'unbalanced-quotes' and self.found is not None:
+            text += "\n" + self.found
+        return text
+
+    def __repr__(self):
+        return (f"Diagnostic({self.file_path!r}, {self.line_num!r}, {self.rule!r}, "
+                f"{self.expected!r}, {self.found!r})")
+
+    def __eq__(self, other):
+        if not isinstance(other, Diagnostic):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in Diagnostic.__slots__)
+
+
+#-----------------------------------------------------------------------------------------------
+# Indentation state
+#-----------------------------------------------------------------------------------------------
+# State of the indentation check part way through a file
+# States are cheap to copy and can be kept as plain data, so they can be checkpointed and the check resumed later
+class IndentState:
+    __slots__ = (
+        'file_path', 'line_length', 'relaxed_line_length', 'style', 'line_num', 'success',
+        'expected_indent', 'prior_indent', 'continued_indent', 'continuation_line', 'specifier_line',
+        'procedure_depth', 'inside_loop_conditional', 'inside_select', 'inside_derived_type', 'interface_block',
+        'on_continued_if_line', 'on_continued_loop_line', 'on_continued_case_line',
+        'inside_procedure_arguments', 'inside_associate_arguments', 'inside_do_concurrent_limits',
+        'readwrite_argument_line', 'readwrite_statement_line',
+        'unbalanced_brackets', 'equality_depth', 'equality_brackets', 'in_single_quote', 'in_double_quote',
+        'conditionals', 'scopes', 'open_scopes', 'statement_start',
+    )
 
+    # The indentation widths are taken from style, a styles.Style (the line length is given separately)
+    def __init__(self, file_path='', line_length=80, relaxed_line_margin=0.1, line_num=1, style=None):
+        self.file_path = file_path
+        self.line_length = line_length
+        self.relaxed_line_length = int(line_length * relaxed_line_margin)
+        self.style = style or DEFAULT_STYLE
+        self.line_num = line_num  # Number of the next line to check
+        self.success = True
+
+        self.expected_indent = 0  # Default expected indentation
+        self.prior_indent = 0  # Indentation to restore after a contains, else or case line
+        self.continued_indent = 0
+        self.continuation_line = False  # Flag to indicate if the previous line was a continuation
+        self.specifier_line = False
+
+        self.procedure_depth = 0
+        self.inside_loop_conditional = False
+        self.inside_select = False
+        self.inside_derived_type = False
+        self.interface_block = False
+        self.on_continued_if_line = False
+        self.on_continued_loop_line = False
+        self.on_continued_case_line = False
+        self.inside_procedure_arguments = False
+        self.inside_associate_arguments = False
+        self.inside_do_concurrent_limits = False
+
+        self.readwrite_argument_line = False
+        self.readwrite_statement_line = False
+
+        self.unbalanced_brackets = 0  # Count of unbalanced brackets
+        self.equality_depth = 0
+        self.equality_brackets = []
+        self.in_single_quote = False
+        self.in_double_quote = False
+
+        # Stack of the open preprocessor conditionals, as (state at the start, state at the end of the first branch)
+        # Tuples of branch states are immutable, so copies of the state share them
+        self.conditionals = ()
+
+        # Index of the scopes opened and closed, if they are recorded (a scopes.ScopeIndex), and the scopes open
+        self.scopes = None
+        self.open_scopes = ()
+        self.statement_start = line_num  # Line the current statement started on
+
+    def copy(self):
+        state = IndentState.__new__(IndentState)
+        for name in IndentState.__slots__:
+            setattr(state, name, getattr(self, name))
+        state.equality_brackets = list(self.equality_brackets)
+        return state
+
+    def __eq__(self, other):
+        if not isinstance(other, IndentState):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in IndentState.__slots__)
+
+    # Whether checking the same lines from this state and other would give the same results,
+    # regardless of the line numbers they are at and the verdict on the lines before them
+    def resumes_like(self, other):
+        return all(getattr(self, name) == getattr(other, name) for name in _RESUMED_SLOTS)
+
+    # Follow a preprocessing directive, checking each branch of a conditional from the state at its start
+    # and continuing after the conditional from the state at the end of its first branch
+    def preprocess(self, directive):
+        match = _CONDITIONAL_DIRECTIVE_RE.match(directive)
+        if not match:
+            return
+        keyword = match.group(1)
+        if keyword.startswith('if'):
+            self.conditionals += ((self._branch_state(), None),)
+        elif not self.conditionals:
+            ## unmatched directives are left to the preprocessor to complain about
+            return
+        elif keyword == 'endif':
+            start, first_branch_end = self.conditionals[-1]
+            self.conditionals = self.conditionals[:-1]
+            if first_branch_end is not None:
+                self._restore_branch_state(first_branch_end)
+        else:
+            start, first_branch_end = self.conditionals[-1]
+            if first_branch_end is None:
+                self.conditionals = self.conditionals[:-1] + ((start, self._branch_state()),)
+            self._restore_branch_state(start)
+
+    def _branch_state(self):
+        return tuple(
+            tuple(self.equality_brackets) if name == 'equality_brackets' else getattr(self, name)
+            for name in _BRANCH_SLOTS
+        )
+
+    def _restore_branch_state(self, branch_state):
+        for name, value in zip(_BRANCH_SLOTS, branch_state):
+            setattr(self, name, value)
+        self.equality_brackets = list(self.equality_brackets)
+
+    # The state as plain data (lists, numbers and booleans), which can be stored as JSON, leaving out what the check
+    # is run with (the file, line length and style) and the index of the scopes
+    def to_data(self):
+        return [self.line_num, self.success, self._branch_state(), self.conditionals]
+
+    # Rebuild a state from the data of to_data, for a check run with the file, line length and style given
+    # Raises ValueError if the data is not that of a state
+    @classmethod
+    def from_data(cls, data, file_path='', line_length=80, relaxed_line_margin=0.1, style=None):
+        line_num, success, branch_state, conditionals = data
+        if type(line_num) is not int or line_num < 1 or type(success) is not bool:
+            raise ValueError("not the data of an indentation state")
+        state = cls(file_path, line_length, relaxed_line_margin, line_num, style)
+        state.success = success
+        state._restore_branch_state(state._branch_state_from_data(branch_state))
+        state.conditionals = tuple(
+            (state._branch_state_from_data(start), None if end is None else state._branch_state_from_data(end))
+            for start, end in conditionals
+        )
+        return state
+
+    # Check the values of a branch state read from data against those of this state, as the types of the values
+    # of each slot never change
+    def _branch_state_from_data(self, data):
+        if type(data) is not list or len(data) != len(_BRANCH_SLOTS):
+            raise ValueError("not the data of an indentation state")
+        branch_state = []
+        for value, default in zip(data, self._branch_state()):
+            if isinstance(default, tuple):
+                if type(value) is not list or not all(type(item) is int for item in value):
+                    raise ValueError("not the data of an indentation state")
+                value = tuple(value)
+            elif type(value) is not type(default):
+                raise ValueError("not the data of an indentation state")
+            branch_state.append(value)
+        return tuple(branch_state)
+
+    # Check the next line, returning its corrected form and a list of Diagnostic
+    # The corrected line is None if the check had to be abandoned
+    # Diagnostics are only produced (and only fail the check) if report is True
+    # If a profiling.Profile is given, the time spent in each phase of the check is recorded in it
+    def feed(self, line, report=True, profile=None):
+        if profile: profile.enter('line-length')
+        line_num = self.line_num
+        self.line_num += 1
+        diagnostics = []
+        style = self.style
+        procedure_indent = style.procedure_indent
+        module_program_indent = style.module_program_indent
+        loop_conditional_indent = style.loop_conditional_indent
+        continuation_indent = style.continuation_indent
+
+        if report:
             # Be more relaxed with comment lines regarding line length (using PEP8, flake8-bugbear, B950)
             # https://stackoverflow.com/questions/46863890/does-pythons-pep8-line-length-limit-apply-to-comments
-            if re.match(r'^\s*!', line):
-                if len(line) > line_length + 1 + relaxed_line_length:
-                    print(f"Comment Line {line_num} in {file_path} exceeds {line_length} characters: {len(line) - 1}")
+            if _COMMENT_LINE_RE.match(line):
+                if len(line) > self.line_length + 1 + self.relaxed_line_length:
+                    diagnostics.append(Diagnostic(self.file_path, line_num, 'comment-line-length', self.line_length, len(line) - 1))
             # check length of line does not exceed
-            elif len(line) > line_length + 1:
-                if len(line) > line_length + 1 + relaxed_line_length:
-                    print(f"Line {line_num} in {file_path} exceeds hard limit {line_length + relaxed_line_length} characters: {len(line) - 1}")
-                    success = False
+            elif len(line) > self.line_length + 1:
+                if len(line) > self.line_length + 1 + self.relaxed_line_length:
+                    diagnostics.append(Diagnostic(self.file_path, line_num, 'line-length', self.line_length + self.relaxed_line_length, len(line) - 1))
+                    self.success = False
                 else:
-                    print(f"Note: Line {line_num} in {file_path} exceeds {line_length} characters: {len(line) - 1}, but within 10% of limit")
-
-            stripped_line = line.rstrip()
+                    diagnostics.append(Diagnostic(self.file_path, line_num, 'relaxed-line-length', self.line_length, len(line) - 1))
 
+        if profile: profile.enter('comment-and-blank-lines')
+        # Classify the line, passing blank lines, comments and preprocessing directives through as they are
+        kind, stripped_line = lexer.lex_free_form(line)
+        if kind != lexer.CODE and kind != lexer.INDENTED_COMMENT:
             # Skip empty lines
-            if not stripped_line:
-                continuation_line = False
-                corrected_lines.append("")
-                continue
-
-            # If comment line !###, skip
-            if re.match(r'^\s*!###', stripped_line):
-                corrected_lines.append(stripped_line)
-                continue
-
-            # Check if preprocessing directive
-            if re.match(r'^\s*#', stripped_line):
-                corrected_lines.append(stripped_line)
-                continue
-
-            # Check for lines with ! in first column and skip
-            if re.match(r'^!', stripped_line):
-                corrected_lines.append(stripped_line)
-                continue
-
-            # Replace all numbers at the start of the line with the same number of spaces
-            stripped_line = re.sub(r'^\d+', lambda x: ' ' * len(x.group()), stripped_line)
-
-            # Check if line starts with comment
-            if re.match(r'^\s*!', stripped_line):
-                actual_indent = len(stripped_line) - len(stripped_line.lstrip())
-                if not check_if_match(actual_indent, expected_indent, continued_indent, continuation_line, line_num, file_path):
-                    success = False
-                    # return False, None
-                correct_lines(corrected_lines, stripped_line, expected_indent, continuation_line, continued_indent)
-                continue
-
-            # If inside a quoted section, check if line starts with ampersand
-            if in_single_quote or in_double_quote:
-                if not re.match(r'^\s*&', stripped_line):
-                    print(f"Unbalanced quotes in {file_path}, line {line_num}")
-                    print(stripped_line)
-                    return False, None
-
-            # Remove quoted sections from this line
-            stripped_line_excld_quote, in_single_quote, in_double_quote = strip_quoted_sections(
-                stripped_line,
-                in_single_quote=in_single_quote,
-                in_double_quote=in_double_quote
-            )
-
-            # Check if line starts with close bracket, if so, update the indentation
-            if re.match(r'^\s*(\)|/\)|\])', stripped_line): #stripped_line_excld_quote):
-                continued_indent = expected_indent + ( unbalanced_brackets - 1 ) * continuation_indent + equality_depth * continuation_indent
-                if readwrite_statement_line:
-                    continued_indent += continuation_indent
-
-            # Count open and close brackets
-            open_bracket_count += stripped_line_excld_quote.count('(')
-            open_bracket_count += stripped_line_excld_quote.count('[')
-            close_bracket_count += stripped_line_excld_quote.count(')')
-            close_bracket_count += stripped_line_excld_quote.count(']')
-            if readwrite_argument_line and re.match(r'^\s*(\)|/\)|\])', stripped_line_excld_quote):
-                readwrite_argument_line = False
-                readwrite_statement_line = True
-            if stripped_line_excld_quote.count('(') + stripped_line_excld_quote.count('[') < \
-                    stripped_line_excld_quote.count(')') + stripped_line_excld_quote.count(']'):
-                unbalanced_brackets -= 1
-            elif stripped_line_excld_quote.count('(') + stripped_line_excld_quote.count('[') > \
-                    stripped_line_excld_quote.count(')') + stripped_line_excld_quote.count(']'):
-                unbalanced_brackets += 1
-
-
-            # Detect end of do loop, if statement, or where statement
-            if re.match(r'^\s*end\s*(do|if|where|select)\b', stripped_line, re.IGNORECASE):
-                expected_indent -= loop_conditional_indent
-
-            # Detect else statements in if and where blocks, can be "PATTERN", "PATTERN\s*if", or "PATTERN\s*where"
-            if inside_loop_conditional and re.match(r'^\s*else\s*(if|where)?\b', stripped_line, re.IGNORECASE):
-                prior_indent = expected_indent
-                expected_indent -= loop_conditional_indent
-                specifier_line = True
-
-
-            # Detect case, type, and rank statements within select, can be "PATTERN(", "PATTERN (" or "PATTERN default"
-            if ( inside_select and re.match(r'^\s*(case|class is|type is|rank)\s*\(', stripped_line, re.IGNORECASE) ) or \
-               ( inside_select and re.match(r'^\s*(case|class|rank)\s+default\b', stripped_line, re.IGNORECASE) ):
-                prior_indent = expected_indent
-                expected_indent -= loop_conditional_indent
-                specifier_line = True
-
-            # Detect if contains line
-            if re.match(r'^\s*contains\b', stripped_line, re.IGNORECASE):
-                prior_indent = expected_indent
-                specifier_line = True
-                if inside_derived_type:
-                    expected_indent -= loop_conditional_indent - 1
+            if kind == lexer.BLANK:
+                self.continuation_line = False
+            elif kind == lexer.DIRECTIVE:
+                self.preprocess(stripped_line)
+            return stripped_line, diagnostics
+
+        # Check if line starts with comment
+        if kind == lexer.INDENTED_COMMENT:
+            actual_indent = len(stripped_line) - len(stripped_line.lstrip())
+            diagnostic = report and _indentation_diagnostic(actual_indent, self.expected_indent, self.continued_indent, self.continuation_line, line_num, self.file_path)
+            if diagnostic:
+                diagnostics.append(diagnostic)
+                self.success = False
+            return corrected_line(stripped_line, self.expected_indent, self.continuation_line, self.continued_indent), diagnostics
+
+        if self.scopes is not None and not self.continuation_line:
+            self.statement_start = line_num
+
+        if profile: profile.enter('quote-stripping')
+        # If inside a quoted section, check if line starts with ampersand
+        if self.in_single_quote or self.in_double_quote:
+            if not _LEADING_AMPERSAND_RE.match(stripped_line):
+                diagnostics.append(Diagnostic(self.file_path, line_num, 'unbalanced-quotes', found=stripped_line))
+                self.success = False
+                return None, diagnostics
+
+        # Remove quoted sections from this line, counting the brackets outside them
+        stripped_line_excld_quote, self.in_single_quote, self.in_double_quote, bracket_delta = scan_quoted_sections(
+            stripped_line,
+            in_single_quote=self.in_single_quote,
+            in_double_quote=self.in_double_quote
+        )
+
+        if profile: profile.enter('bracket-counting')
+        # Check if line starts with close bracket, if so, update the indentation
+        if _CLOSE_BRACKET_RE.match(stripped_line): #stripped_line_excld_quote):
+            self.continued_indent = self.expected_indent + ( self.unbalanced_brackets - 1 ) * continuation_indent + self.equality_depth * continuation_indent
+            if self.readwrite_statement_line:
+                self.continued_indent += continuation_indent
+
+        # Count open and close brackets
+        if self.readwrite_argument_line and _CLOSE_BRACKET_RE.match(stripped_line_excld_quote):
+            self.readwrite_argument_line = False
+            self.readwrite_statement_line = True
+        if bracket_delta < 0:
+            self.unbalanced_brackets -= 1
+        elif bracket_delta > 0:
+            self.unbalanced_brackets += 1
+
+
+        if profile: profile.enter('closing-rules')
+        # Dispatch on the leading keyword to the one closing rule that can apply
+        keyword, _ = _leading_keywords(stripped_line)
+
+        # Detect end of do loop, if, where, select, block, associate, interface, derived type,
+        # procedure, module or program
+        if keyword.startswith('end'):
+            end_match = _END_BLOCK_RE.match(stripped_line)
+            block_kind = _END_BLOCK_KINDS[end_match.group(1).lower()] if end_match else None
+            if block_kind == 'loop_conditional':
+                self.expected_indent -= loop_conditional_indent
+            elif block_kind == 'block':
+                self.expected_indent -= procedure_indent
+            elif block_kind == 'associate':
+                self.expected_indent -= loop_conditional_indent
+            elif block_kind == 'interface':
+                self.interface_block = False
+                self.expected_indent -= loop_conditional_indent
+            elif block_kind == 'derived_type':
+                if self.inside_derived_type:
+                    self.expected_indent -= loop_conditional_indent
+                    self.inside_derived_type = False
+            elif block_kind == 'procedure':
+                if self.procedure_depth > 0:
+                    self.expected_indent -= procedure_indent
+                    self.procedure_depth -= 1
+            elif block_kind == 'module_program':
+                self.expected_indent -= module_program_indent
+            if self.scopes is not None and end_match:
+                self.open_scopes = self.scopes.close(end_match.group(1).lower(), line_num, self.open_scopes)
+
+        # Detect else statements in if and where blocks, can be "PATTERN", "PATTERN\s*if", or "PATTERN\s*where"
+        elif keyword in _ELSE_KEYWORDS:
+            if self.inside_loop_conditional:
+                self.prior_indent = self.expected_indent
+                self.expected_indent -= loop_conditional_indent
+                self.specifier_line = True
+
+        # Detect case, type, and rank statements within select, can be "PATTERN(", "PATTERN (" or "PATTERN default"
+        elif keyword in _CASE_KEYWORDS:
+            if self.inside_select and ( _CASE_RE.match(stripped_line) or _CASE_DEFAULT_RE.match(stripped_line) ):
+                self.prior_indent = self.expected_indent
+                self.expected_indent -= loop_conditional_indent
+                self.specifier_line = True
+
+        # Detect if contains line
+        elif keyword == 'contains':
+            self.prior_indent = self.expected_indent
+            self.specifier_line = True
+            if self.inside_derived_type:
+                self.expected_indent -= loop_conditional_indent - 1
+            else:
+                self.expected_indent -= module_program_indent
+
+
+
+        #-----------------------------------------------------------------------------------------------
+        # Check actual indentation
+        #-----------------------------------------------------------------------------------------------
+        if profile: profile.enter('indentation-check')
+        actual_indent = len(stripped_line) - len(stripped_line.lstrip())
+        corrected = corrected_line(stripped_line, self.expected_indent, self.continuation_line, self.continued_indent)
+        diagnostic = report and _indentation_diagnostic(actual_indent, self.expected_indent, self.continued_indent, self.continuation_line, line_num, self.file_path)
+        if diagnostic:
+            diagnostics.append(diagnostic)
+            self.success = False
+        #-----------------------------------------------------------------------------------------------
+        
+
+        if profile: profile.enter('continuation')
+        # strip comments from end of line
+        stripped_line = _TRAILING_COMMENT_RE.sub('', stripped_line).strip()
+
+        # Check if entering an equality statement
+        if self.equality_depth > 0:
+            if not stripped_line.endswith('&'):
+                self.equality_depth = 0
+            elif self.equality_brackets[-1] > self.unbalanced_brackets:
+                self.equality_depth -=1
+                self.equality_brackets.pop()
+            elif _COMMA_CONTINUATION_RE.search(stripped_line) and self.equality_brackets[-1] == self.unbalanced_brackets:
+                self.equality_depth -= 1
+                self.equality_brackets.pop()
+        if self.equality_depth == 0:
+            self.equality_brackets = []
+
+        # Check if line ends with "&" and has = as the last non-whitespace character before "&"
+        if self.continuation_line:
+            if stripped_line.endswith("&") and _EQUALITY_CONTINUATION_RE.search(stripped_line):
+                self.equality_depth += 1
+                self.equality_brackets.append(self.unbalanced_brackets)
+
+        # Calculate expected indentation for continuation line
+        if self.continuation_line:
+            self.continued_indent = self.expected_indent + self.unbalanced_brackets * continuation_indent + self.equality_depth * continuation_indent
+            if self.readwrite_statement_line:
+                self.continued_indent += continuation_indent
+
+        # Check for line continuation character
+        if stripped_line.endswith('&'):
+            if not self.continuation_line:
+                self.continuation_line = True
+                # Set expected indentation for next line
+                self.continued_indent = self.expected_indent + continuation_indent
+                if self.unbalanced_brackets == 0:
+                    self.unbalanced_brackets = 1
+        else:
+            # If it was a continuation line, reset to normal expected indentation
+            if self.in_single_quote or self.in_double_quote:
+                diagnostics.append(Diagnostic(self.file_path, line_num, 'unbalanced-quotes'))
+                self.success = False
+                return None, diagnostics
+            self.unbalanced_brackets = 0
+            if self.continuation_line:
+                self.continuation_line = False
+            if self.inside_procedure_arguments:
+                self.inside_procedure_arguments = False
+                self.expected_indent += procedure_indent
+            if self.inside_associate_arguments:
+                self.inside_associate_arguments = False
+                self.expected_indent += loop_conditional_indent
+            if self.readwrite_argument_line:
+                self.readwrite_argument_line = False
+            if self.readwrite_statement_line:
+                self.readwrite_statement_line = False
+                
+
+        # Reset from contains line
+        if not self.continuation_line and self.specifier_line:
+            self.specifier_line = False
+            self.expected_indent = self.prior_indent
+        
+
+        if profile: profile.enter('opening-rules')
+        # Dispatch on the leading (or post-label) keyword to the opening rules that can apply
+        rules = _opening_rules(stripped_line)
+        opened = None  # Kind of scope opened by the statement
+
+        # Detect module or program blocks (specifically avoid module procedure/function)
+        if 'module_program' in rules:
+            unit_match = _MODULE_RE.match(stripped_line) or _SUBMODULE_PROGRAM_RE.match(stripped_line)
+            if unit_match:
+                self.expected_indent += module_program_indent
+                opened = unit_match.group().strip().lower()
+
+        # Detect procedure blocks, can be "module (function|subroutine|procedure)" or "(function|subroutine|procedure)" but not "procedure(", "procedure," or "procedure ::"
+        procedure_match = 'procedure' in rules and _PROCEDURE_RE.match(stripped_line)
+        if procedure_match and \
+            not _PROCEDURE_ATTRIBUTE_RE.match(stripped_line) and \
+            not _PROCEDURE_INTERFACE_RE.match(stripped_line):
+            if not ( self.interface_block and _MODULE_PROCEDURE_RE.match(stripped_line) ):
+                opened = procedure_match.group(5).lower()
+                self.procedure_depth += 1
+                if stripped_line.lower().endswith("&"):
+                    self.inside_procedure_arguments = True
                 else:
-                    expected_indent -= module_program_indent
-
-            # Detect end of block block
-            if re.match(r'^\s*end\s*block\b', stripped_line, re.IGNORECASE):
-                expected_indent -= procedure_indent
-
-            # Detect end of associate block
-            if re.match(r'^\s*end\s*associate\b', stripped_line, re.IGNORECASE):
-                expected_indent -= loop_conditional_indent
-
-            # Detect end of interface block
-            if re.match(r'^\s*end\s*interface\b', stripped_line, re.IGNORECASE):
-                interface_block = False
-                expected_indent -= loop_conditional_indent
+                    self.expected_indent += procedure_indent
+
+
+        # Detect derived type block
+        if 'derived_type' in rules and _DERIVED_TYPE_RE.match(stripped_line):
+            self.expected_indent += loop_conditional_indent
+            self.inside_derived_type = True
+            opened = 'type'
+
+        # Detect interface block, can be "abstract interface" or "interface"
+        if 'interface' in rules and _INTERFACE_RE.match(stripped_line):
+            self.interface_block = True
+            self.expected_indent += loop_conditional_indent
+            opened = 'interface'
+
+        # Detect associate block
+        if 'associate' in rules and _ASSOCIATE_RE.match(stripped_line):
+            opened = 'associate'
+            if stripped_line.lower().endswith("&"):
+                self.inside_associate_arguments = True
+            else:
+                self.expected_indent += loop_conditional_indent
+        
+        # Detect block block with optional "NAME:"
+        if 'block' in rules and _BLOCK_RE.match(stripped_line):
+            self.expected_indent += procedure_indent
+            opened = 'block'
+
+        # Detect do loop, and where statement with optional "NAME:"
+        loop_match = 'loop' in rules and _LOOP_RE.match(stripped_line)
+        if loop_match:
+            opened = loop_match.group(1).lower()
+            if stripped_line.lower().endswith("&"):
+                self.on_continued_loop_line = True
+            else:
+                self.expected_indent += loop_conditional_indent
+                self.inside_loop_conditional = True
+
+        # Detect do concurrent linebreak statement with optional "NAME:"
+        if 'do_concurrent' in rules and _DO_CONCURRENT_RE.match(stripped_line):
+            self.inside_do_concurrent_limits = True
+            # self.expected_indent -= loop_conditional_indent
+            self.inside_loop_conditional = False
+        
+        if self.inside_do_concurrent_limits and not self.continuation_line:
+            # if stripped_line.lower().endswith(")"):
+            #     self.expected_indent += loop_conditional_indent
+            self.inside_do_concurrent_limits = False
+            self.inside_loop_conditional = True
+
+
+        # Detect "if RANDOM then" statement with optional "NAME:"
+        if 'if_then' in rules and _IF_THEN_RE.match(stripped_line):
+            self.expected_indent += loop_conditional_indent
+            self.inside_loop_conditional = True
+            opened = 'if'
+
+        # Detect line ends with "then" from unfinished if statement 
+        if self.on_continued_if_line and not self.continuation_line:
+            if stripped_line.lower().endswith("then"):
+                self.expected_indent += loop_conditional_indent
+                opened = 'if'
+            self.on_continued_if_line = False
+
+        # Detect end of continued case line
+        if self.on_continued_case_line and not self.continuation_line:
+            self.expected_indent += loop_conditional_indent
+            self.on_continued_case_line = False
+
+        # Detect end of continued loop line
+        if self.on_continued_loop_line and not self.continuation_line:
+            self.expected_indent += loop_conditional_indent
+            self.on_continued_loop_line = False
+
+        # Detect if linebreak statement with optional "NAME:"
+        if self.continuation_line and 'if' in rules and _IF_RE.match(stripped_line):
+            self.on_continued_if_line = True
+
+        # Detect select type, select case, and select rank
+        if 'select' in rules and _SELECT_RE.match(stripped_line):
+            opened = 'select'
+            if stripped_line.lower().endswith("&"):
+                self.on_continued_case_line = True
+            else:
+                self.expected_indent += loop_conditional_indent
+                self.inside_select = True
 
-            # Detect end of derived type block
-            if inside_derived_type and re.match(r'^\s*end\s*type\b', stripped_line, re.IGNORECASE):
-                expected_indent -= loop_conditional_indent
-                inside_derived_type = False
+        # Detect read/write statement
+        if 'readwrite' in rules and _READWRITE_RE.match(stripped_line) and stripped_line.lower().endswith("&"):
+            if self.unbalanced_brackets == 0:
+                self.readwrite_statement_line = True
+            else:
+                self.readwrite_argument_line = True
 
-            # Detect end of procedure block
-            if procedure_depth > 0 and re.match(r'^\s*end\s*(function|subroutine|procedure)\b', stripped_line, re.IGNORECASE):
-                expected_indent -= procedure_indent
-                procedure_depth -= 1
+        if opened and self.scopes is not None:
+            self.open_scopes = self.scopes.open(opened, stripped_line, self.statement_start, self.open_scopes)
 
-            # Detect end of module or program
-            if re.match(r'^\s*end\s*(submodule|module|program)\b', stripped_line, re.IGNORECASE):
-                expected_indent -= module_program_indent
+        return corrected, diagnostics
 
 
+_RESUMED_SLOTS = tuple(name for name in IndentState.__slots__ if name not in ('line_num', 'success', 'scopes'))
+# Slots making up the block structure, which each branch of a preprocessor conditional starts from
+_BRANCH_SLOTS = tuple(
+    name for name in IndentState.__slots__
+    if name not in (
+        'file_path', 'line_length', 'relaxed_line_length', 'style', 'line_num', 'success', 'conditionals', 'scopes',
+    )
+)
+
+
+# Check lines, returning copies of the state taken before every interval-th line
+# Checking can be resumed from any of these by feeding a copy of it the lines from its line_num onwards
+def checkpoints(lines, file_path='', line_length=80, relaxed_line_margin=0.1, interval=1000, style=None):
+    state = IndentState(file_path, line_length, relaxed_line_margin, style=style)
+    states = [state.copy()]
+    for line in lines:
+        if state.feed(line, report=False)[0] is None:
+            break
+        if (state.line_num - 1) % interval == 0:
+            states.append(state.copy())
+    return states
+
+
+def check_indentation(file_path, line_length=80, relaxed_line_margin=0.1, style=None, fixed_form=False):
+    corrected_code = io.StringIO()
+    (success, complete), _ = _drain(
+        iter_corrected_lines(file_path, line_length, relaxed_line_margin, style=style, fixed_form=fixed_form),
+        corrected_code.write
+    )
+    if not complete:
+        return False, None
+    return success, corrected_code.getvalue()
+
+# Check the indentation of a file, yielding each corrected line as it is produced
+# The file is checked as fixed-form source if fixed_form is True, otherwise as free-form source
+# If a scopes.ScopeIndex is given, the scopes opened and closed in the file are recorded in it
+# Returns (success, complete), where complete is False if the check was abandoned part way through
+def iter_corrected_lines(file_path, line_length=80, relaxed_line_margin=0.1, profile=None, diagnostics=None,
+                         style=None, fixed_form=False, scopes=None):
+    iter_corrected = _iter_corrected_fixed_form_lines if fixed_form else _iter_corrected_lines
+    with source.SourceLines(file_path) as lines:
+        success, complete, last_line = yield from iter_corrected(
+            lines, file_path, line_length, relaxed_line_margin, profile=profile, diagnostics=diagnostics, style=style,
+            scopes=scopes
+        )
+    # if not present, add blank line to end of file
+    if complete and last_line and last_line.strip():
+        yield ""
+    return success, complete
+
+# Check the indentation of only the changed lines of a file, yielding every line of the file
+# changed_ranges are (start, end) line numbers, inclusive, and lines outside them are yielded unchanged
+# The check of each range is resumed from the nearest safe restart point before it, or from a later checkpoint
+# of the state if any is given in checkpoints, a list of (line_num, prefix digest, state) kept from an earlier
+# check of the file, whose lines before the checkpoint are still the same (free-form source only)
+# checkpoints is replaced in place by the checkpoints still valid once the check completes, along with those taken
+# every CHECKPOINT_INTERVAL lines of the ranges checked
+# Returns (success, complete)
+def iter_corrected_changed_lines(file_path, changed_ranges, line_length=80, relaxed_line_margin=0.1, profile=None,
+                                 diagnostics=None, style=None, fixed_form=False, checkpoints=None):
+    with source.SourceLines(file_path) as lines:
+        return (yield from _iter_corrected_changed_lines(
+            lines, file_path, changed_ranges, line_length, relaxed_line_margin, profile, diagnostics, style, fixed_form,
+            checkpoints
+        ))
+
+def _iter_corrected_changed_lines(lines, file_path, changed_ranges, line_length, relaxed_line_margin, profile,
+                                  diagnostics, style, fixed_form=False, checkpoints=None):
+    iter_corrected = _iter_corrected_fixed_form_lines if fixed_form else _iter_corrected_lines
+    changed_ranges = _merge_ranges(changed_ranges)
+    range_starts = [start for start, _ in changed_ranges]
+
+    def changed(line_num):
+        index = bisect.bisect_right(range_starts, line_num) - 1
+        return index >= 0 and line_num <= changed_ranges[index][1]
+
+    ## keep the checkpoints taken after lines that are still the same
+    if fixed_form:
+        checkpoints = None
+    saved = {}
+    if checkpoints:
+        line_nums = sorted(line_num for line_num, _, _ in checkpoints if line_num <= len(lines))
+        digests = dict(zip(line_nums, lines.prefix_digests(line_nums)))
+        saved = {line_num: state for line_num, digest, state in checkpoints if digests.get(line_num) == digest}
+    saved_line_nums = sorted(saved)
+
+    def window_start(start):
+        index = bisect.bisect_right(saved_line_nums, start) - 1
+        return _restart_point(lines, start, saved_line_nums[index] if index >= 0 else 1)
+
+    windows = _merge_ranges(
+        (window_start(start), min(end, len(lines))) for start, end in changed_ranges if start <= len(lines)
+    )
 
-            #-----------------------------------------------------------------------------------------------
-            # Check actual indentation
-            #-----------------------------------------------------------------------------------------------
-            actual_indent = len(stripped_line) - len(stripped_line.lstrip())
-            correct_lines(corrected_lines, stripped_line, expected_indent, continuation_line, continued_indent)
-            if not check_if_match(actual_indent, expected_indent, continued_indent, continuation_line, line_num, file_path):
+    success = True
+    line_num = 1
+    taken = {}
+    for window_start, window_end in windows:
+        for line in lines.range(line_num - 1, window_start - 1):
+            yield line.rstrip('\n')
+        state = None
+        if window_start in saved:
+            state = saved[window_start].copy()
+            state.success = True
+        elif checkpoints is not None:
+            state = IndentState(file_path, line_length, relaxed_line_margin, window_start, style)
+        corrected_lines = iter_corrected(
+            lines.range(window_start - 1, window_end), file_path, line_length, relaxed_line_margin,
+            first_line_num=window_start, report_line=changed, state=state, profile=profile, diagnostics=diagnostics,
+            style=style
+        )
+        line_num = window_start
+        while True:
+            try:
+                corrected_line = next(corrected_lines)
+            except StopIteration as stop:
+                window_success, complete, _ = stop.value
+                break
+            if state is not None and ( state.line_num - 1 ) % CHECKPOINT_INTERVAL == 0 and state.line_num <= len(lines):
+                taken[state.line_num] = state.copy()
+            yield corrected_line if changed(line_num) else lines[line_num - 1].rstrip('\n')
+            line_num += 1
+        if not complete:
+            return False, False
+        success = success and window_success
+    for line in lines.range(line_num - 1, len(lines)):
+        yield line.rstrip('\n')
+    if lines and lines[-1].endswith('\n'):
+        yield ""
+    if checkpoints is not None:
+        saved.update(taken)
+        line_nums = sorted(saved)
+        checkpoints[:] = [
+            (line_num, digest, saved[line_num]) for line_num, digest in zip(line_nums, lines.prefix_digests(line_nums))
+        ]
+    return success, True
+
+# Merge overlapping or adjacent (start, end) ranges
+def _merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+# Find the nearest line at or before line_num from which checking can be resumed with a fresh state
+# This is a module, submodule or program statement starting in the first column that does not follow a continued
+# line (so is not inside a continued statement or quoted section), or else first, the start of the file or a line
+# whose state is known
+def _restart_point(lines, line_num, first=1):
+    for index in range(line_num - 1, first - 1, -1):
+        line = lines[index]
+        if line[:1].isalpha() and ( _MODULE_RE.match(line) or _SUBMODULE_PROGRAM_RE.match(line) ) and \
+           not _TRAILING_COMMENT_RE.sub('', lines[index - 1]).rstrip().endswith('&'):
+            return index + 1
+    return first
+
+# Check the indentation of a sequence of lines, yielding each corrected line as it is produced
+# Checking starts from first_line_num with a fresh state, or resumes from a checkpointed state if given
+# Only lines that pass report_line are reported on, by printing their diagnostics, or by adding them to the
+# diagnostics list if one is given
+# Time spent reading, reporting and writing lines is profiled as the "input-output" phase
+# The scopes of the lines are recorded in scopes, if a scopes.ScopeIndex is given (and checking starts afresh)
+# Returns (success, complete, last_line)
+def _iter_corrected_lines(lines, file_path, line_length=80, relaxed_line_margin=0.1, first_line_num=1, report_line=None,
+                          state=None, profile=None, diagnostics=None, style=None, scopes=None):
+    if state is None:
+        state = IndentState(file_path, line_length, relaxed_line_margin, first_line_num, style)
+        state.scopes = scopes
+    last_line = None
+    if profile: profile.enter('input-output')
+    for line in lines:
+        corrected, line_diagnostics = state.feed(line, report_line is None or report_line(state.line_num), profile)
+        if profile: profile.enter('input-output')
+        if diagnostics is not None:
+            diagnostics += line_diagnostics
+        else:
+            for diagnostic in line_diagnostics:
+                print(diagnostic)
+        if corrected is None:
+            if profile: profile.enter(None)
+            return False, False, last_line
+        last_line = corrected
+        yield corrected
+    if profile: profile.enter(None)
+    return state.success, True, last_line
+
+
+#-----------------------------------------------------------------------------------------------
+# Fixed-form source
+#-----------------------------------------------------------------------------------------------
+# Check the indentation of a sequence of fixed-form lines, with the same arguments and results as _iter_corrected_lines
+# The statement field (from column 7) of each code line is checked as a free-form line would be, with the label
+# field and continuation column left as they are. Instead of the line length of the style, code is warned about
+# if it extends past the statement field.
+def _iter_corrected_fixed_form_lines(lines, file_path, line_length=80, relaxed_line_margin=0.1, first_line_num=1,
+                                     report_line=None, state=None, profile=None, diagnostics=None, style=None,
+                                     scopes=None):
+    if state is None:
+        ## the statement field of a line, with a continuation mark added, never reaches this length
+        state = IndentState(file_path, lexer.FIXED_FORM_STATEMENT_END, 0, first_line_num, style)
+        state.scopes = scopes
+    success = True
+    last_line = None
+    line_num = state.line_num
+    do_labels = []  # Labels of the statements ending the open labelled do loops, innermost last
+    loop_ends = []  # Lines of the terminal statements of labelled do loops still to be closed
+    if profile: profile.enter('input-output')
+    for kind, text, start, label, continued in _lex_fixed_form_lines(lines):
+        corrected = text
+        line_diagnostics = []
+        report = report_line is None or report_line(line_num)
+        body = text[start:lexer.FIXED_FORM_STATEMENT_END]
+        code = body.lstrip()
+        if kind == lexer.DIRECTIVE:
+            state.preprocess(text)
+        elif ( kind == lexer.CODE or kind == lexer.CONTINUATION ) and code:
+            label = label.strip()
+            if report and label and not label.isdigit():
+                line_diagnostics.append(Diagnostic(file_path, line_num, 'label-field', found=label))
                 success = False
-                # return False, None
-            #-----------------------------------------------------------------------------------------------
-            
-
-            # strip comments from end of line
-            stripped_line = re.sub(r'!.*', '', stripped_line).strip()
-
-            # Check if entering an equality statement
-            if equality_depth > 0:
-                if not stripped_line.endswith('&'):
-                    equality_depth = 0
-                elif equality_brackets[-1] > unbalanced_brackets:
-                    equality_depth -=1
-                    equality_brackets.pop()
-                elif re.search(r',\s*&$', stripped_line) and equality_brackets[-1] == unbalanced_brackets:
-                    equality_depth -= 1
-                    equality_brackets.pop()
-            if equality_depth == 0:
-                equality_brackets = []
-
-            # Check if line ends with "&" and has = as the last non-whitespace character before "&"
-            if continuation_line:
-                if stripped_line.endswith("&") and re.search(r'=\s*&$', stripped_line):
-                    equality_depth += 1
-                    equality_brackets.append(unbalanced_brackets)
-
-            # Calculate expected indentation for continuation line
-            if continuation_line:
-                continued_indent = expected_indent + unbalanced_brackets * continuation_indent + equality_depth * continuation_indent
-                if readwrite_statement_line:
-                    continued_indent += continuation_indent
-
-            # Check for line continuation character
-            if stripped_line.endswith('&'):
-                if not continuation_line:
-                    continuation_line = True
-                    # Set expected indentation for next line
-                    continued_indent = expected_indent + continuation_indent
-                    if unbalanced_brackets == 0:
-                        unbalanced_brackets = 1
+            if report and len(text) > lexer.FIXED_FORM_STATEMENT_END:
+                line_diagnostics.append(Diagnostic(
+                    file_path, line_num, 'fixed-line-length', lexer.FIXED_FORM_STATEMENT_END, len(text)
+                ))
+            statement = _TRAILING_COMMENT_RE.sub('', code)
+
+            if kind == lexer.CODE:
+                ## labelled do loops are closed after their terminal statement, or before it if it is a continue
+                ## statement (an end do statement closes the innermost of them itself)
+                closing = 0
+                if label and label in do_labels:
+                    closing = do_labels.count(label)
+                    do_labels = [do_label for do_label in do_labels if do_label != label]
+                    terminal = _LOOP_TERMINAL_RE.match(statement)
+                    if terminal:
+                        loop_ends += [line_num] * ( closing - ( terminal.group(1).lower() != 'continue' ) )
+                        closing = 0
+                for loop_end in loop_ends:
+                    state.line_num = loop_end
+                    state.feed(" end do", report=False)
+                loop_ends = [line_num] * closing
+                do_match = _LABELLED_DO_RE.match(statement)
+                if do_match:
+                    do_labels.append(do_match.group(1))
+
+            ## a line continuing a quoted section has no indentation of its own
+            inside_quotes = kind == lexer.CONTINUATION and ( state.in_single_quote or state.in_double_quote )
+            if inside_quotes:
+                free_form_line = "&" + body
+            elif kind == lexer.CODE and _BARE_END_RE.match(statement):
+                ## a bare end statement closes the procedure or program it is in
+                ending = "end procedure" if state.procedure_depth else "end program" if state.expected_indent else "end"
+                free_form_line = " " * (len(body) - len(code)) + ending
             else:
-                # If it was a continuation line, reset to normal expected indentation
-                if in_single_quote or in_double_quote:
-                    print(f"Unbalanced quotes in {file_path}, line {line_num}")
-                    return False, None
-                open_bracket_count = 0
-                close_bracket_count = 0
-                unbalanced_brackets = 0
-                if continuation_line:
-                    continuation_line = False
-                if inside_procedure_arguments:
-                    inside_procedure_arguments = False
-                    expected_indent += procedure_indent
-                if inside_associate_arguments:
-                    inside_associate_arguments = False
-                    expected_indent += loop_conditional_indent
-                if readwrite_argument_line:
-                    readwrite_argument_line = False
-                if readwrite_statement_line:
-                    readwrite_statement_line = False
-                    
-
-            # Reset from contains line
-            if not continuation_line and specifier_line:
-                specifier_line = False
-                expected_indent = prior_indent
-            
-
-            # Detect module or program blocks (specifically avoid module procedure/function)
-            if re.match(r'^\s*module\b(?!\s+(recursive|procedure|function|subroutine))', stripped_line, re.IGNORECASE) or \
-                re.match(r'^\s*(submodule|program)\b', stripped_line, re.IGNORECASE):
-                expected_indent += module_program_indent
-
-            # Detect procedure blocks, can be "module (function|subroutine|procedure)" or "(function|subroutine|procedure)" but not "procedure(", "procedure," or "procedure ::"
-            if re.match(r'^\s*(integer\s+|logical\s+)?(elemental\s+|recursive\s+|pure\s+)?(module\s+)?(recursive\s+)?(function|subroutine|procedure)\b', stripped_line, re.IGNORECASE) and \
-                not re.match(r'^\s*(function|subroutine|procedure)\s*(,|::)', stripped_line, re.IGNORECASE) and \
-                not re.match(r'^\s*procedure\s*(\(|\,)', stripped_line, re.IGNORECASE): # and \
-                # not ( interface_block and re.match(r'^(?!\s*procedure\s+\w+\s*\()', stripped_line, re.IGNORECASE) ):
-                if not ( interface_block and re.match(r'^\s*(module\s+)?procedure\b', stripped_line, re.IGNORECASE) ):
-                    # print(stripped_line)
-                    # print("INTERFACE BLOCK: ", interface_block)
-                    # print(re.match(r'^\s*(integer\s+)', stripped_line, re.IGNORECASE), stripped_line)
-                    procedure_depth += 1
-                    if stripped_line.lower().endswith("&"):
-                        inside_procedure_arguments = True
-                    else:
-                        expected_indent += procedure_indent
-
-
-            # Detect derived type block
-            if re.match(r'^\s*type\s*(::|,)', stripped_line, re.IGNORECASE):
-                expected_indent += loop_conditional_indent
-                inside_derived_type = True
-
-            # Detect interface block, can be "abstract interface" or "interface"
-            if re.match(r'^\s*(abstract\s+)?interface\b', stripped_line, re.IGNORECASE):
-                interface_block = True
-                expected_indent += loop_conditional_indent
-
-            # Detect associate block
-            if re.match(r'^\s*associate\b', stripped_line, re.IGNORECASE):
-                if stripped_line.lower().endswith("&"):
-                    inside_associate_arguments = True
-                else:
-                    expected_indent += loop_conditional_indent
-            
-            # Detect block block
-            if re.match(r'^\s*\w+\s*:\s*block\b', stripped_line, re.IGNORECASE) or \
-               re.match(r'^\s*block\b', stripped_line, re.IGNORECASE):
-                expected_indent += procedure_indent
-
-            # Detect do loop, and where statement with optional "NAME:"
-            if re.match(r'^\s*\w+\s*:\s*(do|where)\b', stripped_line, re.IGNORECASE) or \
-               re.match(r'^\s*(do|where)\b', stripped_line, re.IGNORECASE):
-                if stripped_line.lower().endswith("&"):
-                    on_continued_loop_line = True
-                else:
-                    expected_indent += loop_conditional_indent
-                    inside_loop_conditional = True
-
-            # Detect do concurrent linebreak statement with optional "NAME:"
-            if re.match(r'^\s*\w+\s*:\s*do\s+concurrent\b', stripped_line, re.IGNORECASE) or \
-               re.match(r'^\s*do\s+concurrent\b', stripped_line, re.IGNORECASE):
-                inside_do_concurrent_limits = True
-                # expected_indent -= loop_conditional_indent
-                inside_loop_conditional = False
-            
-            if inside_do_concurrent_limits and not continuation_line:
-                # if stripped_line.lower().endswith(")"):
-                #     expected_indent += loop_conditional_indent
-                inside_do_concurrent_limits = False
-                inside_loop_conditional = True
-
-
-            # Detect "if RANDOM then" statement with optional "NAME:"
-            if re.match(r'^\s*\w*\s*:\s*if\s*\(.*\)\s*then\b', stripped_line, re.IGNORECASE) or \
-               re.match(r'^\s*if\s*\(.*\)\s*then\b', stripped_line, re.IGNORECASE):
-                expected_indent += loop_conditional_indent
-                inside_loop_conditional = True
-
-            # Detect line ends with "then" from unfinished if statement 
-            if on_continued_if_line and not continuation_line:
-                if stripped_line.lower().endswith("then"):
-                    expected_indent += loop_conditional_indent
-                on_continued_if_line = False
-
-            # Detect end of continued case line
-            if on_continued_case_line and not continuation_line:
-                expected_indent += loop_conditional_indent
-                on_continued_case_line = False
-
-            # Detect end of continued loop line
-            if on_continued_loop_line and not continuation_line:
-                expected_indent += loop_conditional_indent
-                on_continued_loop_line = False
-
-            # Detect if linebreak statement with optional "NAME:"
-            if continuation_line and \
-               ( re.match(r'^\s*\w+\s*:\s*(if)\b', stripped_line, re.IGNORECASE) or \
-                 re.match(r'^\s*(if)\b', stripped_line, re.IGNORECASE) ):
-                on_continued_if_line = True
-
-            # Detect select type, select case, and select rank
-            if re.match(r'^\s*(?:\w+\s*:\s*)?select\s+(type|case|rank)\b', stripped_line, re.IGNORECASE):
-                if stripped_line.lower().endswith("&"):
-                    on_continued_case_line = True
-                else:
-                    expected_indent += loop_conditional_indent
-                    inside_select = True
-
-            # Detect read/write statement
-            if re.match(r'^\s*(read|write)\s*\(', stripped_line, re.IGNORECASE) and stripped_line.lower().endswith("&"):
-                if unbalanced_brackets == 0:
-                    readwrite_statement_line = True
+                free_form_line = body
+            if continued:
+                comment = free_form_line.find("!")
+                if comment == -1:
+                    free_form_line += " &"
                 else:
-                    readwrite_argument_line = True
-
-
-    # if not present, add blank line to end of file
-    if corrected_lines[-1].strip():
-        corrected_lines.append("")
-    return success, "\n".join(corrected_lines)
-
+                    free_form_line = free_form_line[:comment] + "&" + free_form_line[comment:]
+
+            state.line_num = line_num
+            corrected_body, feed_diagnostics = state.feed(free_form_line, report and not inside_quotes, profile)
+            if profile: profile.enter('input-output')
+            line_diagnostics += feed_diagnostics
+            if corrected_body is None:
+                corrected = None
+            elif not inside_quotes:
+                indent = len(corrected_body) - len(corrected_body.lstrip())
+                corrected = text[:start] + " " * indent + code
+                ## lines that cannot be re-indented within the statement field are left as they are
+                if len(corrected) > lexer.FIXED_FORM_STATEMENT_END or len(text) > lexer.FIXED_FORM_STATEMENT_END:
+                    corrected = text
+
+        if diagnostics is not None:
+            diagnostics += line_diagnostics
+        else:
+            for diagnostic in line_diagnostics:
+                print(diagnostic)
+        if corrected is None:
+            if profile: profile.enter(None)
+            return False, False, last_line
+        line_num += 1
+        last_line = corrected
+        yield corrected
+    if profile: profile.enter(None)
+    return success and state.success, True, last_line
+
+# Lex fixed-form lines, yielding (kind, text, start, label, continued) for each line in order, where continued is
+# whether a code line is continued by the next code line, which can come after comment lines
+def _lex_fixed_form_lines(lines):
+    pending = None
+    held = []
+    for line in lines:
+        lexed = lexer.lex_fixed_form(line)
+        if lexed[0] != lexer.CODE and lexed[0] != lexer.CONTINUATION:
+            if pending is None:
+                yield lexed + (False,)
+            else:
+                held.append(lexed + (False,))
+            continue
+        if pending is not None:
+            yield pending + (lexed[0] == lexer.CONTINUATION,)
+            yield from held
+            held = []
+        pending = lexed
+    if pending is not None:
+        yield pending + (False,)
+        yield from held
+
+
+# Compile ignore patterns into one matcher, which returns the first pattern (in the order given) that a
+# filename matches, or None
+def _pattern_matcher(patterns):
+    if not patterns:
+        return lambda filename: None
+    pairs = [(pattern, re.compile(pattern)) for pattern in patterns]
+    ## most filenames match none of the patterns, which a single combined pattern finds out in one go
+    ## patterns with groups are left out of it and always tried, as combining patterns renumbers their groups,
+    ##  which breaks any backreference to them
+    unfiltered = [(pattern, regex) for pattern, regex in pairs if regex.groups]
+    combined = None
+    if len(unfiltered) < len(pairs):
+        try:
+            combined = re.compile('|'.join(f'(?:{pattern})' for pattern, regex in pairs if not regex.groups))
+        except re.error:
+            unfiltered = pairs
+    def matching_pattern(filename):
+        for pattern, regex in pairs if combined is not None and combined.match(filename) else unfiltered:
+            if regex.match(filename):
+                return pattern
+        return None
+    return matching_pattern
+
+# Compile ignore directories into one matcher, which returns whether a path contains any of them
+def _directory_matcher(directories):
+    if not directories:
+        return lambda path: False
+    search = re.compile('|'.join(re.escape(directory) for directory in directories)).search
+    return lambda path: search(path) is not None
+
+def _skip_messages(filename, ignore_pattern, ignore_directory):
+    messages = []
+    skip_file = False
+    ## check if file matches ignore patterns
+    pattern = ignore_pattern(filename)
+    if pattern is not None:
+        skip_file = True
+        messages.append(f"Skipping file {filename} because it matches the ignore pattern {pattern}.")
+    ## check if file is in ignore directories
+    if ignore_directory(filename):
+        skip_file = True
+    if skip_file:
+        messages.append(f"Skipping file {filename} because it is in an ignored directory.")
+    return messages
+
+# Find the files with one of extensions in paths, which may be directories, files or glob patterns
+# Directories are walked in sorted order, without descending into ignored directories or following links to
+# directories, and ignored files are left out
+def _find_files(paths, extensions, ignore_pattern, ignore_directory):
+    for path in paths:
+        ## glob.escape only changes paths with wildcards in them
+        matches = sorted(glob.glob(path, recursive=True)) if glob.escape(path) != path else [path]
+        for match in matches:
+            if os.path.isdir(match):
+                yield from _walk(match, extensions, ignore_pattern, ignore_directory)
+            elif match.endswith(extensions) and ignore_pattern(match) is None and not ignore_directory(match):
+                yield match
+
+def _walk(directory, extensions, ignore_pattern, ignore_directory):
+    prefix = '' if directory == os.curdir else os.path.join(directory, '')
+    try:
+        with os.scandir(directory) as scan:
+            entries = sorted(scan, key=lambda entry: entry.name)
+    except OSError:
+        return
+    for entry in entries:
+        path = prefix + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            ## every file below a directory whose path contains an ignored directory contains it too
+            if not ignore_directory(path + os.sep):
+                yield from _walk(path, extensions, ignore_pattern, ignore_directory)
+        elif entry.name.endswith(extensions) and ignore_pattern(path) is None and not ignore_directory(path):
+            yield path
+
+# Check a single file, collecting its diagnostics so they can be reported grouped by file
+# When autofixing, a failed file whose corrected contents differ from the original is staged to replace it, and
+# when diffing, the differences of a failed file from its corrected contents are found
+# If changed_ranges is given, only those ranges of lines are checked and fixed
+# If fixed_form is True, the file is checked as fixed-form source
+# If scope_index is 'json' or 'binary', the index of the scopes of a file checked in full is written next to it
+# If profile is True, the check is profiled and its profiling.Profile returned, otherwise None is
+# If checkpoints is given, checking changed lines resumes from the checkpoints it holds (as JSON, or empty if there
+# are none yet), and the checkpoints to keep for the next check are returned as JSON, otherwise None is
+# Returns (success, fix, diagnostics, profile, timing, checkpoints), where fix is the path of the staged file or the
+# diff (None if there is no fix) and timing is (lines, seconds) for the whole check
+def _check_file(filename, changed_ranges=None, style=DEFAULT_STYLE, fixed_form=False, checkpoints=None, autofix=False,
+                diff=False, profile=False, scope_index=None):
+    start = time.perf_counter()
+    if checkpoints is not None:
+        checkpoints = _load_checkpoints(checkpoints, filename, style) if checkpoints else []
+    if not profile:
+        success, fix, diagnostics, line_count = _check_file_diagnostics(
+            filename, changed_ranges, style, fixed_form, autofix, diff, scope_index=scope_index,
+            checkpoints=checkpoints
+        )
+        return success, fix, diagnostics, None, (line_count, time.perf_counter() - start), _dump_checkpoints(checkpoints)
+    profile = profiling.Profile()
+    with profile.patterns_timed(globals()), profile.patterns_timed(vars(lexer)):
+        success, fix, diagnostics, line_count = _check_file_diagnostics(
+            filename, changed_ranges, style, fixed_form, autofix, diff, profile, scope_index, checkpoints
+        )
+    profile.seconds = time.perf_counter() - start
+    profile.files = 1
+    profile.lines = profile.phases.get('line-length', (0,))[0]
+    return success, fix, diagnostics, profile, (line_count, profile.seconds), _dump_checkpoints(checkpoints)
+
+# Checkpoints are cached as JSON lists of their line number, the digest of the lines before it and the data of
+# their state, so reading them back runs no code from the cache
+def _dump_checkpoints(checkpoints):
+    if checkpoints is None:
+        return None
+    return json.dumps([[line_num, digest, state.to_data()] for line_num, digest, state in checkpoints]).encode()
+
+def _load_checkpoints(data, filename, style):
+    try:
+        checkpoints = []
+        for line_num, digest, state in json.loads(data):
+            if type(line_num) is not int or type(digest) is not str:
+                raise ValueError("not a checkpoint")
+            checkpoints.append((line_num, digest, IndentState.from_data(
+                state, filename, style.line_length, style.relaxed_line_margin, style
+            )))
+        return checkpoints
+    except (ValueError, TypeError):
+        ## checkpoints that cannot be read are taken again
+        return []
+
+def _check_file_diagnostics(filename, changed_ranges, style, fixed_form, autofix, diff, profile=None,
+                            scope_index=None, checkpoints=None):
+    diagnostics = []
+    fix = None
+    index = None
+    if changed_ranges is None:
+        index = scopes.ScopeIndex() if scope_index else None
+        corrected_lines = iter_corrected_lines(
+            filename, style.line_length, style.relaxed_line_margin, profile, diagnostics, style, fixed_form, index
+        )
+    else:
+        corrected_lines = iter_corrected_changed_lines(
+            filename, changed_ranges, style.line_length, style.relaxed_line_margin, profile, diagnostics, style,
+            fixed_form, checkpoints
+        )
+    try:
+        if autofix:
+            (success, complete), line_count, temp_path = _stage_autofix(filename, corrected_lines)
+            if not success and complete and not filecmp.cmp(temp_path, filename, shallow=False):
+                ## synced here, in parallel with the other files, so replacing the original later needs no sync
+                fixes.fsync(temp_path)
+                fix = temp_path
+            else:
+                os.remove(temp_path)
+        elif diff:
+            (success, complete), line_count, file_diff = _stage_diff(filename, corrected_lines)
+            if not success and complete and file_diff:
+                fix = file_diff
+        else:
+            (success, complete), line_count = _drain(corrected_lines)
+    except (OSError, UnicodeDecodeError) as e:
+        ## a file that cannot be read fails on its own, without stopping the check of the other files
+        diagnostics.append(_unreadable_diagnostic(filename, e))
+        return False, None, diagnostics, 0
+    if index is not None and complete:
+        scopes.write_sidecar(index, filename, scope_index)
+    return success, fix, diagnostics, line_count
+
+# The diagnostic of a file that could not be read, on the first line that is not valid in the source encoding if
+# that is why
+def _unreadable_diagnostic(filename, error):
+    if isinstance(error, UnicodeDecodeError):
+        ## the position of the error is in the block being decoded, so the file is decoded again to find its line
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            data.decode(source.ENCODING)
+        except UnicodeDecodeError as e:
+            return Diagnostic(
+                filename, data.count(b'\n', 0, e.start) + 1, 'unreadable',
+                found=f"byte 0x{data[e.start]:02x} is not valid {source.ENCODING}"
+            )
+        except OSError as e:
+            error = e
+    return Diagnostic(filename, 1, 'unreadable', found=getattr(error, 'strerror', None) or str(error))
+
+# Yield the results of _check_file for each file, in the order the files were given
+def _check_files(filenames, changed_ranges, file_styles, file_forms, jobs, autofix=False, diff=False, profile=False,
+                 scope_index=None, file_checkpoints=None):
+    check_file = functools.partial(_check_file, autofix=autofix, diff=diff, profile=profile, scope_index=scope_index)
+    if file_checkpoints is None:
+        file_checkpoints = [None] * len(filenames)
+    if jobs <= 1 or len(filenames) <= 1:
+        yield from map(check_file, filenames, changed_ranges, file_styles, file_forms, file_checkpoints)
+        return
+    ## only imported here, as most runs check too few files to start processes for them
+    import concurrent.futures
+    jobs = min(jobs, len(filenames))
+    chunksize = max(1, len(filenames) // (jobs * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(
+            check_file, filenames, changed_ranges, file_styles, file_forms, file_checkpoints, chunksize=chunksize
+        )
+
+
+# Diagnostics are cached as JSON lists of their fields
+def _dump_diagnostics(diagnostics):
+    return json.dumps([[getattr(diagnostic, name) for name in Diagnostic.__slots__] for diagnostic in diagnostics])
+
+def _load_diagnostics(text):
+    return [Diagnostic(*fields) for fields in json.loads(text)]
+
+# The style a file is checked with is part of its digest in the cache, so only the code of the check is fingerprinted:
+# the checker itself and the modules that read, classify and style the lines it checks
+def _open_cache(args):
+    fingerprint = cache.options_fingerprint(
+        *(cache.file_digest(path) for path in (__file__, lexer.__file__, source.__file__, styles.__file__))
+    )
+    try:
+        return cache.ResultCache(args.cache_dir or cache.default_cache_dir(), fingerprint, args.max_cache_entries)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: not using the result cache: {e}", file=sys.stderr)
+        return None
+
+
+# Print the profile of each file and their total, and/or write them to a JSON file
+def _report_profiles(profiles, print_tables, json_path):
+    total = profiling.Profile()
+    for file_profile in profiles.values():
+        total.merge(file_profile)
+    if print_tables:
+        for filename, file_profile in profiles.items():
+            print(file_profile.table(filename))
+        print(total.table(f"{total.files} files"))
+    if json_path:
+        with open(json_path, 'w', encoding='UTF-8') as f:
+            json.dump({
+                'files': {filename: file_profile.as_dict() for filename, file_profile in profiles.items()},
+                'total': total.as_dict(),
+            }, f, indent=2)
+
+
+class _RunError(Exception):
+    pass
+
+# Check and report the selected files, given as (filename, messages explaining why it is skipped), returning
+# the set of files that failed
+# Results are replayed from result_cache and/or memory_cache (a dict of filename -> (digest, success,
+# diagnostics)) where they are given, except when checking changed lines, which instead resumes from the
+# checkpoints kept in result_cache
+# Raises _RunError if the styles of the files or the changes to them cannot be read
+def _run(args, selected_files, fixed_form_extensions, start, result_cache=None, memory_cache=None):
+    profile = args.profile or bool(args.profile_json)
+    check_filenames = [filename for filename, skip_messages in selected_files if not skip_messages]
+
+    ## resolve the style of each file from the configuration of its directory and those above it
+    style_resolver = styles.StyleResolver(
+        DEFAULT_STYLE, {'line_length': args.line_length, 'relaxed_line_margin': args.relaxed_line_margin}
+    )
+    try:
+        file_styles = {filename: style_resolver.style_for(filename) for filename in check_filenames}
+    except (OSError, styles.StyleError) as e:
+        raise _RunError(str(e))
+
+    ## the form of each file is given by its extension, so files of both forms are checked in one run
+    file_forms = {filename: filename.endswith(fixed_form_extensions) for filename in check_filenames}
+
+    ## replay the results of files that are unchanged since they were last checked
+    digests = {}
+    cached_results = {}
+    if not args.changed_lines_from and ( result_cache is not None or memory_cache is not None ):
+        for filename in check_filenames:
+            ## files are cached by their contents and the style and form they are checked with
+            try:
+                digests[filename] = cache.options_fingerprint(
+                    cache.file_digest(filename), file_styles[filename], file_forms[filename]
+                )
+            except OSError:
+                continue
+            cached_result = None
+            if memory_cache is not None and filename in memory_cache and memory_cache[filename][0] == digests[filename]:
+                cached_result = memory_cache[filename][1:]
+            elif result_cache:
+                cached_result = result_cache.lookup(filename, digests[filename])
+                if cached_result:
+                    cached_result = cached_result[0], _load_diagnostics(cached_result[1])
+            ## failed files must be checked again to produce their corrected code
+            if cached_result and ( cached_result[0] or not ( args.autofix or args.diff ) ):
+                cached_results[filename] = cached_result
+
+    ## restrict checking to the lines changed since the given git ref
+    uncached_filenames = [filename for filename in check_filenames if filename not in cached_results]
+    if args.changed_lines_from:
+        ## git and its output are only needed here, so are only imported here
+        import subprocess
+        from fortran_format_hooks import git_changes
+        try:
+            changed_ranges = git_changes.changed_line_ranges(args.changed_lines_from, uncached_filenames)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise _RunError(f"could not read the changes since {args.changed_lines_from} from git: {(getattr(e, 'stderr', None) or str(e)).strip()}")
+        changed_ranges = [changed_ranges[os.path.abspath(filename)] for filename in uncached_filenames]
+    else:
+        changed_ranges = [None] * len(uncached_filenames)
+
+    ## checkpoints are kept for each file and the style and form it is checked with
+    checkpoint_options = {}
+    file_checkpoints = [None] * len(uncached_filenames)
+    if args.changed_lines_from and result_cache:
+        for position, filename in enumerate(uncached_filenames):
+            if changed_ranges[position] is not None:
+                checkpoint_options[filename] = cache.options_fingerprint(file_styles[filename], file_forms[filename])
+                file_checkpoints[position] = result_cache.lookup_checkpoints(filename, checkpoint_options[filename]) or b''
+
+    results = _check_files(
+        uncached_filenames, changed_ranges, [file_styles[filename] for filename in uncached_filenames],
+        [file_forms[filename] for filename in uncached_filenames], args.jobs or os.cpu_count() or 1, args.autofix, args.diff,
+        profile, args.scope_index, file_checkpoints
+    )
 
-def main(argv: Optional[Sequence[str]] = None) -> int:
+    failed_files = set()
+    profiles = {}
+    run_summary = summary.RunSummary(args.slowest)
+    reporter = reporters.REPORTERS[args.format](sys.stdout)
+
+    def report(filename, skip_messages, file_success=None, fix=None, diagnostics=None, timing=None):
+        if skip_messages:
+            reporter.skipped(filename, skip_messages)
+            run_summary.skip(filename)
+            return
+        fixed = fix is not None and not args.diff
+        reporter.checked(filename, file_success, fixed, diagnostics)
+        if fix is not None and args.diff:
+            reporter.diff(filename, fix)
+        run_summary.check(filename, file_success, fixed, diagnostics, timing)
+        if not file_success:
+            failed_files.add(filename)
+
+    ## fixed files are only replaced once every file has been checked, and their results only reported once they
+    ## have been, so no fix is announced that was not made
+    fix_batch = fixes.FixBatch()
+    reports = []
+    try:
+        for filename, skip_messages in selected_files:
+            if skip_messages:
+                reports.append((filename, skip_messages))
+                if not args.autofix:
+                    report(*reports.pop())
+                continue
+            fix = None
+            if filename in cached_results:
+                file_success, diagnostics = cached_results[filename]
+                timing = None
+            else:
+                file_success, fix, diagnostics, file_profile, timing, checkpoints = next(results)
+                if file_profile:
+                    profiles[filename] = file_profile
+                if checkpoints is not None:
+                    result_cache.store_checkpoints(filename, checkpoint_options[filename], checkpoints)
+                if filename in digests:
+                    if result_cache:
+                        result_cache.store(filename, digests[filename], file_success, _dump_diagnostics(diagnostics))
+                    if memory_cache is not None:
+                        memory_cache[filename] = (digests[filename], file_success, diagnostics)
+            if fix is not None and not args.diff:
+                fix_batch.add(filename, fix)
+            reports.append((filename, None, file_success, fix, diagnostics, timing))
+            if not args.autofix:
+                report(*reports.pop())
+        unwritten = fix_batch.commit()
+    finally:
+        fix_batch.discard()
+    for filename, skip_messages, *result in reports:
+        if filename in unwritten:
+            file_success, _, diagnostics, timing = result
+            result = file_success, None, diagnostics + [
+                Diagnostic(filename, 1, 'unwritable', found=unwritten[filename].strerror or str(unwritten[filename]))
+            ], timing
+        report(filename, skip_messages, *result)
+    reporter.close()
+
+    if profile:
+        _report_profiles(profiles, args.profile, args.profile_json)
+    run_summary.wall_seconds = time.perf_counter() - start
+    if args.summary:
+        ## keep JSON and SARIF output on stdout parseable
+        print(run_summary.table(), file=sys.stdout if args.format == 'text' else sys.stderr)
+    if args.summary_json:
+        with open(args.summary_json, 'w', encoding='UTF-8') as f:
+            json.dump(run_summary.as_dict(), f, indent=2)
+    return failed_files
+
+
+# Check the selected files, then again whenever they change, until interrupted, returning 0 if every file passed
+# its last check and 1 otherwise
+# The files are watched in the directories they were found in (and the whole of the trees checked recursively),
+# so files added to the trees are checked too; each batch of changes only checks the files changed
+# Raises _RunError if the first check of the files fails to run
+def _watch(args, selected_files, fixed_form_extensions, extensions, ignore_pattern, ignore_directory, start,
+           result_cache, memory_cache):
+    given_files = {os.path.normpath(filename) for filename, _ in selected_files}
+    trees = []
+    for path in args.recursive or ():
+        ## glob patterns are watched from the directory holding their first wildcard
+        while glob.escape(path) != path:
+            path = os.path.dirname(path)
+        if os.path.isdir(path or os.curdir):
+            trees.append(os.path.normpath(path or os.curdir))
+        else:
+            given_files.add(os.path.normpath(path))
+    tree_prefixes = tuple('' if tree == os.curdir else os.path.join(tree, '') for tree in trees)
+    directories = sorted({os.path.dirname(filename) or os.curdir for filename in given_files})
+
+    def is_watched(path):
+        if path in given_files:
+            return path.endswith(extensions)
+        return (
+            path.startswith(tree_prefixes) and path.endswith(extensions) and ignore_pattern(path) is None
+            and not ignore_directory(path)
+        )
+
+    def list_files():
+        return sorted(set(_find_files(trees, extensions, ignore_pattern, ignore_directory)) | given_files)
+
+    from fortran_format_hooks import watch
+    watcher = watch.open_watcher(
+        trees, directories, lambda directory: not ignore_directory(directory), list_files, args.watch_poll
+    )
+    try:
+        ## the watch starts before the first check, so no change made during it is missed
+        failed_files = _run(args, selected_files, fixed_form_extensions, start, result_cache, memory_cache)
+        failed_files = {os.path.normpath(filename) for filename in failed_files}
+        sys.stdout.flush()
+        print(f"Watching for changes ({type(watcher).__name__}), press Ctrl+C to stop.", file=sys.stderr)
+        try:
+            for changed in watch.batches(watcher, args.watch_debounce):
+                changed_files = sorted(path for path in changed if is_watched(path))
+                ## files deleted or moved away are no longer failing
+                failed_files.difference_update(changed_files)
+                batch = [
+                    (filename, _skip_messages(filename, ignore_pattern, ignore_directory))
+                    for filename in changed_files if os.path.isfile(filename)
+                ]
+                if not batch:
+                    continue
+                try:
+                    failed_files.update(
+                        _run(args, batch, fixed_form_extensions, time.perf_counter(), result_cache, memory_cache)
+                    )
+                except _RunError as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+        return 1 if failed_files else 0
+    finally:
+        watcher.close()
+
+
+# The parser of the command line arguments of main
+def _argument_parser():
     # Code copied form https://github.com/pre-commit/pre-commit-hooks/blob/main/pre_commit_hooks/check_added_large_files.py
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -460,12 +1645,12 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
         help='Filenames pre-commit believes are changed.',
     )
     parser.add_argument(
-        '--line-length', type=int, default=80,
-        help='Maximum line length.',
+        '--line-length', type=int, default=None,
+        help='Maximum line length (overrides the style configuration, 80 by default).',
     )
     parser.add_argument(
-        '--relaxed-line-margin', type=float, default=0.1,
-        help='Leniency for line length check (0.1 = 10%).',
+        '--relaxed-line-margin', type=float, default=None,
+        help='Leniency for line length check (0.1 = 10%%, overrides the style configuration, 0.1 by default).',
     )
     parser.add_argument(
         '--autofix',
@@ -473,6 +1658,12 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
         dest='autofix',
         help='Automatically fixes encountered indentation errors.',
     )
+    parser.add_argument(
+        '--diff',
+        action='store_true',
+        dest='diff',
+        help='Print the fixes of encountered indentation errors as a unified diff, instead of writing them.',
+    )
     ## add option to ignore filepath patterns
     parser.add_argument(
         '--ignore-patterns',
@@ -487,41 +1678,157 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
         nargs='*',
         help='Ignore files in these directories.',
     )
-    args = parser.parse_args(argv)
+    ## add options to find the files to check in source trees
+    parser.add_argument(
+        '--recursive', nargs='+', metavar='PATH', default=None,
+        help='Also check the files found in these directories or glob patterns (ignored files and directories '
+             'are left out without a message).',
+    )
+    parser.add_argument(
+        '--extensions', nargs='+', default=list(hook.FREE_FORM_EXTENSIONS),
+        help='Extensions of the free-form files to check.',
+    )
+    parser.add_argument(
+        '--fixed-form-extensions', nargs='*', default=list(hook.FIXED_FORM_EXTENSIONS),
+        help='Extensions of the fixed-form files to check (none to only check free-form files).',
+    )
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=None,
+        help='Number of files to check in parallel (defaults to the number of CPUs; the pre-commit hook is '
+             'declared require_serial, so pre-commit runs a single process of the hook).',
+    )
+    ## add options for the cache of results from previous runs
+    parser.add_argument(
+        '--cache-dir', default=None,
+        help='Directory for the cache of results from previous runs.',
+    )
+    parser.add_argument(
+        '--max-cache-entries', type=int, default=cache.DEFAULT_MAX_ENTRIES,
+        help='Maximum number of results kept in the cache.',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        dest='no_cache',
+        help='Do not read or write the cache of results from previous runs.',
+    )
+    parser.add_argument(
+        '--changed-lines-from', dest='changed_lines_from', metavar='REF', default=None,
+        help='Only check and fix the lines changed since this git ref (untracked files, ignored ones included, are '
+             'checked in full).',
+    )
+    ## add options to profile the time spent in each phase and detection rule of the check
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        dest='profile',
+        help='Print the calls and time of each phase and detection rule, for each file and the whole run.',
+    )
+    parser.add_argument(
+        '--profile-json', dest='profile_json', metavar='FILE', default=None,
+        help='Write the profile of each file and the whole run to this JSON file (implies profiling).',
+    )
+    parser.add_argument(
+        '--format', choices=sorted(reporters.REPORTERS), default='text',
+        help='Format of the results: text, one JSON object per file, or a SARIF log.',
+    )
+    parser.add_argument(
+        '--scope-index', dest='scope_index', choices=sorted(scopes.SIDECAR_SUFFIXES), default=None,
+        help='Also write an index of the scopes (modules, procedures, types, interfaces and constructs) of each '
+             'checked file next to it, as FILE.scopes.json or a binary FILE.scopes.',
+    )
+    ## add options to summarise the whole run
+    parser.add_argument(
+        '--summary',
+        action='store_true',
+        dest='summary',
+        help='Print the totals of the run, the diagnostics of each rule and the slowest files at the end.',
+    )
+    parser.add_argument(
+        '--summary-json', dest='summary_json', metavar='FILE', default=None,
+        help='Write the summary of the run to this JSON file.',
+    )
+    parser.add_argument(
+        '--slowest', type=int, default=10, metavar='N',
+        help='Number of the slowest files to list in the summary.',
+    )
+    ## add options to keep checking files as they change
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        dest='watch',
+        help='After checking the files, keep watching them (and the --recursive trees) and check the files that '
+             'change again, until interrupted.',
+    )
+    parser.add_argument(
+        '--watch-debounce', dest='watch_debounce', type=float, default=0.2, metavar='SECONDS',
+        help='Time without changes after which the changes seen while watching are checked as one batch.',
+    )
+    parser.add_argument(
+        '--watch-poll',
+        action='store_true',
+        dest='watch_poll',
+        help='Watch by polling the files for changes, rather than with inotify.',
+    )
+    return parser
 
-    success = True
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = _argument_parser()
+    args = parser.parse_args(argv)
+    if args.autofix and args.diff:
+        parser.error("--autofix and --diff cannot be used together")
+    if args.diff and args.format == 'sarif':
+        parser.error("--diff cannot be used with --format sarif, whose log has no place for the diffs")
+    if args.scope_index and args.changed_lines_from:
+        parser.error("--scope-index needs whole files to be checked, so cannot be used with --changed-lines-from")
+    start = time.perf_counter()
+
+    fixed_form_extensions = tuple(args.fixed_form_extensions)
+    extensions = tuple(args.extensions) + fixed_form_extensions
+    ignore_pattern = _pattern_matcher(args.ignore_patterns)
+    ignore_directory = _directory_matcher(args.ignore_directories)
+
+    ## select the files to check, keeping the reasons for skipping any so they print in order
+    selected_files = []
     for filename in args.filenames:
-        skip_file = False
-        ## only apply if .f90 or .F90 file
-        if not filename.endswith('.f90') and not filename.endswith('.F90'):
+        ## only apply to files with the given extensions, .f90 or .F90 (and fixed-form .f, .for or .f77) by default
+        if not filename.endswith(extensions):
             continue
-        ## check if file matches ignore patterns
-        if args.ignore_patterns:
-            for pattern in args.ignore_patterns:
-                if re.match(pattern, filename):
-                    skip_file = True
-                    print(f"Skipping file {filename} because it matches the ignore pattern {pattern}.")
-                    break
-        ## check if file is in ignore directories
-        if args.ignore_directories:
-            for directory in args.ignore_directories:
-                if directory in filename:
-                    skip_file = True
-                    break
-        if skip_file:
-            print(f"Skipping file {filename} because it is in an ignored directory.")
-            continue
-        success, corrected_code = check_indentation(filename, args.line_length, args.relaxed_line_margin)
-        # if not check_indentation(filename, args.line_length):
-        #     success = 1
-        if success:
-            print(f"{filename} passed indentation check.")
-        else:
-            print(f"{filename} failed indentation check.")
-            if args.autofix:
-                _autofix(filename, corrected_code)
- 
-    return 0 if success else 1
+        skip_messages = _skip_messages(filename, ignore_pattern, ignore_directory)
+        selected_files.append((filename, skip_messages))
+
+    ## add the files found in source trees, skipping those already given
+    if args.recursive:
+        for path in args.recursive:
+            if not os.path.exists(path) and glob.escape(path) == path:
+                parser.error(f"no such file or directory: {path}")
+        given_files = set(args.filenames)
+        for filename in _find_files(args.recursive, extensions, ignore_pattern, ignore_directory):
+            if filename not in given_files:
+                given_files.add(filename)
+                selected_files.append((filename, []))
+
+    profile = args.profile or bool(args.profile_json)
+    ## results are only replayed for whole files checked without side outputs
+    cacheable = not ( args.changed_lines_from or profile or args.scope_index )
+    ## checking changed lines only keeps checkpoints in the cache
+    result_cache = _open_cache(args) if ( cacheable or args.changed_lines_from ) and not args.no_cache else None
+    try:
+        try:
+            if args.watch:
+                ## a watch keeps the results of the files checked in memory, to replay those changed back as they were
+                return _watch(
+                    args, selected_files, fixed_form_extensions, extensions, ignore_pattern, ignore_directory, start,
+                    result_cache, {} if cacheable else None
+                )
+            failed_files = _run(args, selected_files, fixed_form_extensions, start, result_cache)
+        except _RunError as e:
+            parser.error(str(e))
+    finally:
+        if result_cache:
+            result_cache.close()
+    return 1 if failed_files else 0
 
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -0,0 +1,176 @@
+import os
+import shutil
+import collections
+
+## Apply or show the fixes of a run.
+##  Corrected files are staged as temporary files next to their originals while files are checked, each synced to
+##  disk by the process that checked it, and replace them all in one phase at the end: each is renamed over its
+##  original, and each directory is synced once. An interrupted run leaves no source half written.
+##  Fixes can instead be shown as a unified diff, built line by line from the lines the check changed.
+
+
+# Corrected files staged to replace their originals
+class FixBatch:
+    def __init__(self):
+        self.staged = []  # (filename, temp_path)
+
+    def add(self, filename, temp_path):
+        self.staged.append((filename, temp_path))
+
+    # Replace the originals, returning the files that could not be replaced, with the error for each
+    def commit(self):
+        staged, self.staged = self.staged, []
+        directories = set()
+        errors = {}
+        for filename, temp_path in staged:
+            try:
+                replace(filename, temp_path)
+            except OSError as e:
+                errors[filename] = e
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                continue
+            directories.add(os.path.dirname(os.path.realpath(filename)))
+        for directory in sorted(directories):
+            fsync(directory)
+        return errors
+
+    # Remove the staged files not yet committed
+    def discard(self):
+        staged, self.staged = self.staged, []
+        for _, temp_path in staged:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+# Atomically replace a file with its staged corrected file, keeping its mode
+# A symbolic link is followed, so the file it points to is replaced and the link kept
+# A file with other hard links is instead overwritten in place (not atomically), so every link sees the fix
+# Based on the pre-commit/pre-commit-hooks repository
+# https://github.com/pre-commit/pre-commit-hooks/blob/main/pre_commit_hooks/pretty_format_json.py
+def replace(filename: str, temp_path: str) -> None:
+    target = os.path.realpath(filename)
+    if os.stat(target).st_nlink > 1:
+        shutil.copyfile(temp_path, target)
+        fsync(target)
+        os.remove(temp_path)
+        return
+    shutil.copymode(target, temp_path)
+    os.replace(temp_path, target)
+
+# Sync a file (or directory) to disk
+def fsync(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        ## directories cannot be opened (or synced) on some platforms
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# Unified diff of a file and its corrected lines, which correspond one to one with the lines of the file
+# The lines of the file are given with their line endings untranslated, so the diff shows any line endings an
+# autofix would change
+# The corrected text is written in the pieces produced when draining a check (each line after the first
+# starting with the newline ending the line before it), and only the hunks around changed lines are kept
+class LineDiff:
+    def __init__(self, filename, original_lines, context=3):
+        self.filename = filename
+        self.context = context
+        self._original_lines = iter(original_lines)
+        self._pending = None  # Corrected line waiting to find out whether a newline ends it
+        self._line_num = 0
+        self._before = collections.deque(maxlen=context)  # Unchanged lines before the next hunk
+        self._hunk = None  # [start line, lines of the hunk as (prefix, line)]
+        self._trailing = 0  # Unchanged lines at the end of the open hunk
+        self._removed = []
+        self._added = []
+        self._hunks = []
+
+    def write(self, text):
+        if self._pending is None:
+            self._pending = text
+            return
+        if text.startswith("\n"):
+            self._compare(self._pending + "\n")
+            self._pending = text[1:]
+        else:
+            self._pending += text
+
+    # The diff, which is empty if no line was changed
+    def close(self):
+        if self._pending:
+            self._compare(self._pending)
+        self._pending = None
+        for original in self._original_lines:
+            self._compare(None, original)
+        self._close_hunk()
+        if not self._hunks:
+            return ""
+        return f"--- a/{self.filename}\n+++ b/{self.filename}\n" + "".join(self._hunks)
+
+    def _compare(self, corrected, original=None):
+        if corrected is not None:
+            original = next(self._original_lines, None)
+        self._line_num += 1
+        if original == corrected:
+            if self._hunk is None:
+                self._before.append(original)
+                return
+            self._flush_changes()
+            self._hunk[1].append((" ", original))
+            self._trailing += 1
+            if self._trailing > 2 * self.context:
+                self._close_hunk()
+            return
+        if self._hunk is None:
+            self._hunk = [self._line_num - len(self._before), [(" ", line) for line in self._before]]
+            self._before.clear()
+        self._trailing = 0
+        if original is not None:
+            self._removed.append(original)
+        if corrected is not None:
+            self._added.append(corrected)
+
+    def _flush_changes(self):
+        self._hunk[1] += [("-", line) for line in self._removed] + [("+", line) for line in self._added]
+        self._removed = []
+        self._added = []
+
+    def _close_hunk(self):
+        if self._hunk is None:
+            return
+        self._flush_changes()
+        start, lines = self._hunk
+        ## keep only the context after the last change, the rest can start the next hunk
+        extra = max(0, self._trailing - self.context)
+        if extra:
+            self._before.extend(line for _, line in lines[-extra:])
+            del lines[-extra:]
+        old_count = sum(prefix != "+" for prefix, _ in lines)
+        new_count = sum(prefix != "-" for prefix, _ in lines)
+        text = [f"@@ -{_hunk_range(start, old_count)} +{_hunk_range(start, new_count)} @@\n"]
+        for prefix, line in lines:
+            text.append(prefix + line)
+            if not line.endswith("\n"):
+                text.append("\n\\ No newline at end of file\n")
+        self._hunks.append("".join(text))
+        self._hunk = None
+        self._trailing = 0
+
+
+def _hunk_range(start, count):
+    if count == 1:
+        return f"{start}"
+    if count == 0:
+        return f"{start - 1},0"
+    return f"{start},{count}"
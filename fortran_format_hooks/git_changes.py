@@ -0,0 +1,80 @@
+import os
+import re
+import subprocess
+
+## Read the lines changed since a git ref from the local repository, using plain git.
+
+
+_FILE_HEADER_RE = re.compile(r'^\+\+\+ (.*?)\t?$')  # git ends the name with a tab if it has a space in it
+_HUNK_HEADER_RE = re.compile(r'^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+_QUOTED_CHARACTER_RE = re.compile(r'\\([0-7]{3}|.)')
+_QUOTED_CHARACTERS = {'a': '\a', 'b': '\b', 't': '\t', 'n': '\n', 'v': '\v', 'f': '\f', 'r': '\r'}
+
+
+def _git(*args):
+    ## pathspecs are the file names as given, without any glob or magic in them
+    return subprocess.run(
+        ('git', '--literal-pathspecs', '-c', 'core.quotePath=false') + args,
+        check=True, capture_output=True, text=True, errors='surrogateescape',
+    ).stdout
+
+# Undo the C-style quoting git applies to names with quotes, backslashes or control characters in them
+def _unquote(name):
+    if not ( len(name) >= 2 and name.startswith('"') and name.endswith('"') ):
+        return name
+    def unescape(match):
+        escape = match.group(1)
+        if len(escape) == 3:
+            return chr(int(escape, 8))
+        return _QUOTED_CHARACTERS.get(escape, escape)
+    ## octal escapes are the bytes of the UTF-8 encoding of the name, each unescaped here as one character
+    unescaped = _QUOTED_CHARACTER_RE.sub(unescape, name[1:-1])
+    return os.fsdecode(unescaped.encode('latin-1', errors='surrogateescape'))
+
+# Return the ranges of lines added or modified in the working tree since ref, for each of filenames
+# Ranges are (start, end) line numbers, inclusive, keyed by absolute path
+# Files git does not track, ignored ones included, map to None, meaning every line is new, as does any file whose
+# changes could not be read from the diff; tracked files with no changes map to an empty list
+def changed_line_ranges(ref, filenames):
+    changed_ranges = {os.path.abspath(filename): None for filename in filenames}
+    if not filenames:
+        return changed_ranges
+
+    ## paths from git are relative to the top of the work tree, wherever git is run from
+    toplevel = _git('rev-parse', '--show-toplevel').rstrip('\n')
+    def absolute(path):
+        return os.path.abspath(os.path.join(toplevel, path))
+
+    changed = {absolute(path) for path in _git('diff', '--name-only', '-z', ref, '--', *filenames).split('\0') if path}
+    for path in _git('ls-files', '-z', '--full-name', '--', *filenames).split('\0'):
+        if path and absolute(path) not in changed:
+            changed_ranges[absolute(path)] = []
+
+    diff = _git(
+        'diff', '--no-color', '--no-ext-diff', '--unified=0',
+        '--src-prefix=a/', '--dst-prefix=b/', ref, '--', *filenames
+    )
+    ranges = None
+    hunk_lines = 0  # lines of the current hunk still to skip, which could otherwise pass for headers
+    for line in diff.split('\n'):
+        if hunk_lines:
+            if not line.startswith('\\'):  # "\ No newline at end of file" is not counted
+                hunk_lines -= 1
+            continue
+        file_header = _FILE_HEADER_RE.match(line)
+        if file_header:
+            name = _unquote(file_header.group(1))
+            ## deleted files and any header not understood leave the ranges of their file as they are
+            ranges = None
+            if name.startswith('b/') and absolute(name[2:]) in changed:
+                ranges = changed_ranges[absolute(name[2:])] = []
+            continue
+        hunk_header = _HUNK_HEADER_RE.match(line)
+        if hunk_header:
+            start = int(hunk_header.group(2))
+            count = int(hunk_header.group(3) or 1)
+            hunk_lines = int(hunk_header.group(1) or 1) + count
+            ## a count of zero is a pure deletion, which leaves no changed lines
+            if count and ranges is not None:
+                ranges.append((start, start + count - 1))
+    return changed_ranges
@@ -0,0 +1,102 @@
+import sys
+
+## Entry point of the check-fortran-indentation hook.
+##  pre-commit runs the hook on every commit, most often without any Fortran file among those changed. The
+##  arguments are therefore scanned first, importing nothing beyond the interpreter itself: when no file has one
+##  of the extensions checked and no option asks for output of its own, the hook returns at once, without
+##  importing the checker or compiling its rules. Any other arguments, including those this scan does not
+##  understand, go to the full parser of check_indentation.main, which also reports errors in them.
+
+
+FREE_FORM_EXTENSIONS = ('.f90', '.F90')
+FIXED_FORM_EXTENSIONS = ('.f', '.F', '.for', '.FOR', '.f77', '.F77')
+
+
+def _parses(convert):
+    def valid(value):
+        try:
+            convert(value)
+        except ValueError:
+            return False
+        return True
+    return valid
+
+# Options that only change how files are checked, so do nothing without files, and the check of their value
+_VALUE_OPTIONS = {
+    '--line-length': _parses(int),
+    '--relaxed-line-margin': _parses(float),
+    '--jobs': _parses(int),
+    '-j': _parses(int),
+    '--cache-dir': str,
+    '--max-cache-entries': _parses(int),
+    '--changed-lines-from': str,
+    '--format': ('text', 'json').__contains__,  # a SARIF log is written even without files
+    '--scope-index': ('binary', 'json').__contains__,
+    '--slowest': _parses(int),
+}
+_FLAG_OPTIONS = frozenset(('--autofix', '--diff', '--no-cache'))
+_LIST_OPTIONS = frozenset(('--ignore-patterns', '--ignore-directories'))
+_EXTENSION_OPTIONS = ('--extensions', '--fixed-form-extensions')
+_CONFLICTING_OPTIONS = (frozenset(('--autofix', '--diff')), frozenset(('--scope-index', '--changed-lines-from')))
+
+
+# Whether the arguments leave nothing to check: none of the files given has one of the extensions checked, and
+# every option is one understood here, with a valid value, that does nothing without files
+def nothing_to_check(argv):
+    filenames = []
+    extensions = {'--extensions': FREE_FORM_EXTENSIONS, '--fixed-form-extensions': FIXED_FORM_EXTENSIONS}
+    options = set()
+    files_end = None  # position just after the last file given
+    position = 0
+    while position < len(argv):
+        argument = argv[position]
+        position += 1
+        if argument == '-' or not argument.startswith('-'):
+            ## the full parser takes the files given as one run of arguments, and rejects any given after an option
+            ##  that follows that run
+            if files_end is not None and files_end != position - 1:
+                return False
+            filenames.append(argument)
+            files_end = position
+            continue
+        option, equals, value = argument.partition('=')
+        if option in _LIST_OPTIONS or option in _EXTENSION_OPTIONS:
+            if equals:
+                values = [value]
+            else:
+                end = position
+                while end < len(argv) and not argv[end].startswith('-'):
+                    end += 1
+                values, position = argv[position:end], end
+            if option in _EXTENSION_OPTIONS:
+                if not values:
+                    return False
+                extensions[option] = tuple(values)
+        elif option in _VALUE_OPTIONS:
+            if not equals:
+                if position == len(argv):
+                    return False
+                value = argv[position]
+                position += 1
+            ## values that look like options are left for the full parser to make sense of
+            if value.startswith('-') or not _VALUE_OPTIONS[option](value):
+                return False
+        elif option not in _FLAG_OPTIONS or equals:
+            return False
+        options.add(option)
+    if any(conflict <= options for conflict in _CONFLICTING_OPTIONS):
+        return False
+    checked_extensions = extensions['--extensions'] + extensions['--fixed-form-extensions']
+    return not any(filename.endswith(checked_extensions) for filename in filenames)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if nothing_to_check(argv):
+        return 0
+    from fortran_format_hooks import check_indentation
+    return check_indentation.main(argv)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
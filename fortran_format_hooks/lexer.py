@@ -0,0 +1,76 @@
+import re
+
+## Classify the physical lines of Fortran source, once each, for the checkers of free-form and fixed-form source.
+
+
+# Kinds of physical line
+BLANK = 'blank'
+COMMENT = 'comment'  # Comment left as it is
+INDENTED_COMMENT = 'indented-comment'  # Free-form comment indented with the code around it
+DIRECTIVE = 'directive'  # Preprocessing directive
+CODE = 'code'  # Start of a statement
+CONTINUATION = 'continuation'  # Fixed-form line continuing the statement of the code line before it
+
+# Columns of the fixed-form label field, continuation column and statement field
+FIXED_FORM_LABEL_END = 5
+FIXED_FORM_CONTINUATION_COLUMN = 6
+FIXED_FORM_STATEMENT_END = 72
+
+_SEPARATOR_COMMENT_RE = re.compile(r'^\s*!###')
+_DIRECTIVE_RE = re.compile(r'^\s*#')
+_LEADING_LABEL_RE = re.compile(r'^\d+')
+_INDENTED_COMMENT_RE = re.compile(r'^\s*!')
+
+_FIXED_FORM_COMMENT_CHARACTERS = frozenset('Cc*!')
+
+
+# Classify a line of free-form source, returning its kind and the line without trailing whitespace
+# A statement label at the start of a code line (or indented comment) is replaced by spaces
+def lex_free_form(line):
+    first_character = line[:1]
+    ## comments and preprocessing directives starting in the first column are the most common
+    if first_character == '!':
+        return COMMENT, line.rstrip()
+    if first_character == '#':
+        return DIRECTIVE, line.rstrip()
+    text = line.rstrip()
+    if not text:
+        return BLANK, text
+    if _SEPARATOR_COMMENT_RE.match(text):
+        return COMMENT, text
+    if _DIRECTIVE_RE.match(text):
+        return DIRECTIVE, text
+    if text[:1].isdigit():
+        text = _LEADING_LABEL_RE.sub(lambda x: ' ' * len(x.group()), text)
+    if _INDENTED_COMMENT_RE.match(text):
+        return INDENTED_COMMENT, text
+    return CODE, text
+
+# Classify a line of fixed-form source, returning its kind, the line without trailing whitespace, the index
+# at which its statement field starts, and its label field
+# A tab in the label field ends it, with the statement field (or a continuation digit) following the tab
+def lex_fixed_form(line):
+    text = line.rstrip()
+    if not text:
+        return BLANK, text, len(text), ''
+    if text[0] in _FIXED_FORM_COMMENT_CHARACTERS:
+        return COMMENT, text, len(text), ''
+    if text[0] == '#':
+        return DIRECTIVE, text, len(text), ''
+
+    label_end = FIXED_FORM_LABEL_END
+    tab = text.find('\t', 0, FIXED_FORM_CONTINUATION_COLUMN)
+    if tab != -1:
+        label_end = tab
+        continued = text[tab + 1:tab + 2] in ('1', '2', '3', '4', '5', '6', '7', '8', '9')
+        start = tab + 2 if continued else tab + 1
+    else:
+        mark = text[label_end:FIXED_FORM_CONTINUATION_COLUMN]
+        continued = mark not in ('', ' ', '0')
+        start = FIXED_FORM_CONTINUATION_COLUMN
+    label = text[:label_end]
+
+    ## "!" anywhere but the continuation column starts a comment
+    if label.lstrip()[:1] == '!' or ( not continued and not label.strip() and text[start:].lstrip()[:1] == '!' ):
+        return COMMENT, text, len(text), ''
+    return (CONTINUATION if continued else CODE), text, start, label
@@ -0,0 +1,120 @@
+import re
+import time
+import contextlib
+
+## Call counts and cumulative time of the phases of the indentation check, and of the statement
+##  patterns used by each detection rule, to find which constructs are expensive to check.
+
+
+_PATTERN_NAME_RE = re.compile(r'^_(\w+)_RE$')
+
+
+# Counts and times for one file, or the sum of several
+class Profile:
+    def __init__(self):
+        self.files = 0
+        self.lines = 0
+        self.seconds = 0.0
+        self.phases = {}  # phase -> [calls, seconds]
+        self.rules = {}  # rule -> [calls, seconds]
+        self._phase = None
+        self._phase_start = 0.0
+
+    # Switch the phase being timed, ending the current one; None ends timing until the next phase
+    def enter(self, phase):
+        now = time.perf_counter()
+        if self._phase is not None:
+            self.phases[self._phase][1] += now - self._phase_start
+        if phase is not None:
+            entry = self.phases.get(phase)
+            if entry is None:
+                entry = self.phases[phase] = [0, 0.0]
+            entry[0] += 1
+        self._phase = phase
+        self._phase_start = now
+
+    def _record_rule(self, rule, seconds):
+        entry = self.rules.get(rule)
+        if entry is None:
+            entry = self.rules[rule] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    # Time the statement patterns (the module-level _NAME_RE globals) of a namespace while inside the context
+    # Each pattern is recorded as the rule "name", e.g. _IF_THEN_RE as "if-then"
+    @contextlib.contextmanager
+    def patterns_timed(self, namespace):
+        originals = {}
+        for name, value in list(namespace.items()):
+            match = _PATTERN_NAME_RE.match(name)
+            if match and isinstance(value, re.Pattern):
+                originals[name] = value
+                namespace[name] = _TimedPattern(value, match.group(1).lower().replace('_', '-'), self)
+        try:
+            yield self
+        finally:
+            namespace.update(originals)
+
+    def merge(self, other):
+        self.files += other.files
+        self.lines += other.lines
+        self.seconds += other.seconds
+        for totals, entries in ((self.phases, other.phases), (self.rules, other.rules)):
+            for name, (calls, seconds) in entries.items():
+                entry = totals.setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += seconds
+
+    def as_dict(self):
+        return {
+            'files': self.files,
+            'lines': self.lines,
+            'seconds': self.seconds,
+            'phases': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in _ranked(self.phases)},
+            'rules': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in _ranked(self.rules)},
+        }
+
+    # Table of the phases and rules, each ranked by cumulative time
+    def table(self, title):
+        rows = [f"Profile of {title}: {self.lines} lines in {self.seconds * 1e3:.2f} ms"]
+        for heading, entries in (('phase', self.phases), ('rule', self.rules)):
+            rows.append(f"  {heading:<24}{'calls':>10}{'total ms':>11}{'us/call':>10}{'share':>8}")
+            for name, (calls, seconds) in _ranked(entries):
+                share = seconds / self.seconds if self.seconds else 0.0
+                rows.append(f"  {name:<24}{calls:>10}{seconds * 1e3:>11.2f}{seconds * 1e6 / calls:>10.2f}{share:>8.1%}")
+        return "\n".join(rows)
+
+    def __getstate__(self):
+        return {name: value for name, value in vars(self).items() if not name.startswith('_')}
+
+    def __setstate__(self, state):
+        self.__init__()
+        vars(self).update(state)
+
+
+def _ranked(entries):
+    return sorted(entries.items(), key=lambda item: item[1][1], reverse=True)
+
+
+# Stand-in for a compiled pattern that records the time taken by each use of it
+class _TimedPattern:
+    def __init__(self, pattern, rule, profile):
+        self._pattern = pattern
+        self._rule = rule
+        self._profile = profile
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._profile._record_rule(self._rule, time.perf_counter() - start)
+
+    def match(self, string, *position):
+        return self._timed(self._pattern.match, string, *position)
+
+    def search(self, string, *position):
+        return self._timed(self._pattern.search, string, *position)
+
+    def sub(self, repl, string):
+        return self._timed(self._pattern.sub, repl, string)
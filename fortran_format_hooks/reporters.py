@@ -0,0 +1,121 @@
+import os
+import json
+import urllib.parse
+
+## Write the results of checking each file, as the hook's text output or as JSON or SARIF for other tools.
+##  The results of each file are written in one go once the file has been checked.
+
+
+TOOL_NAME = 'fortran-format-hooks'
+TOOL_URI = 'https://github.com/nedtaylor'
+
+SARIF_VERSION = '2.1.0'
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+
+# The text output of the hook, as it has always been printed
+class TextReporter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def skipped(self, filename, messages):
+        self.stream.write("".join(f"{message}\n" for message in messages))
+
+    def checked(self, filename, success, fixed, diagnostics):
+        lines = [f"{diagnostic}\n" for diagnostic in diagnostics]
+        if success:
+            lines.append(f"{filename} passed indentation check.\n")
+        else:
+            lines.append(f"{filename} failed indentation check.\n")
+            if fixed:
+                lines.append(f"Fixing file {filename}\n")
+        self.stream.write("".join(lines))
+
+    def diff(self, filename, diff):
+        self.stream.write(diff)
+
+    def close(self):
+        self.stream.flush()
+
+
+# One JSON object per line for each file, with its verdict and diagnostics
+class JsonReporter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def skipped(self, filename, messages):
+        self._write({'file': filename, 'skipped': True, 'messages': messages})
+
+    def checked(self, filename, success, fixed, diagnostics):
+        self._write({
+            'file': filename,
+            'success': success,
+            'fixed': fixed,
+            'diagnostics': [diagnostic.as_dict() for diagnostic in diagnostics],
+        })
+
+    def diff(self, filename, diff):
+        self._write({'file': filename, 'diff': diff})
+
+    def _write(self, result):
+        self.stream.write(json.dumps(result) + "\n")
+
+    def close(self):
+        self.stream.flush()
+
+
+# A SARIF log with one run, whose results are written out file by file
+class SarifReporter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.rules = {}  # rule -> default level, in the order first seen
+        self.separator = ""
+        self.stream.write(
+            '{"version": "%s", "$schema": "%s", "runs": [{"results": [' % (SARIF_VERSION, SARIF_SCHEMA)
+        )
+
+    def skipped(self, filename, messages):
+        pass
+
+    # Never called, as --diff is refused with this format
+    def diff(self, filename, diff):
+        pass
+
+    def checked(self, filename, success, fixed, diagnostics):
+        if not diagnostics:
+            return
+        uri = urllib.parse.quote(filename.replace(os.sep, '/'))
+        results = []
+        for diagnostic in diagnostics:
+            self.rules.setdefault(diagnostic.rule, diagnostic.severity)
+            results.append(json.dumps({
+                'ruleId': diagnostic.rule,
+                'level': diagnostic.severity,
+                'message': {'text': diagnostic.message},
+                'locations': [{
+                    'physicalLocation': {
+                        'artifactLocation': {'uri': uri},
+                        'region': {'startLine': diagnostic.line_num},
+                    },
+                }],
+            }))
+        self.stream.write(self.separator + ", ".join(results))
+        self.separator = ", "
+
+    def close(self):
+        driver = {
+            'name': TOOL_NAME,
+            'informationUri': TOOL_URI,
+            'rules': [
+                {'id': rule, 'defaultConfiguration': {'level': level}} for rule, level in self.rules.items()
+            ],
+        }
+        self.stream.write('], "tool": %s}]}\n' % json.dumps({'driver': driver}))
+        self.stream.flush()
+
+
+REPORTERS = {
+    'text': TextReporter,
+    'json': JsonReporter,
+    'sarif': SarifReporter,
+}
@@ -0,0 +1,164 @@
+import re
+import sys
+import json
+import array
+import struct
+from typing import NamedTuple
+
+## Index of the scopes of a file (modules, procedures, derived types, interfaces and constructs), recorded by the
+##  indentation check as it finds where each one opens and closes, so other tools can reuse the one pass over
+##  the file rather than parsing it again. The index is kept in flat arrays, one entry per scope in the order
+##  the scopes open, and can be written as JSON or as a compact binary sidecar file.
+##
+## Binary format (little-endian):
+##  header    magic b'FFHS', version (uint16), number of scopes (uint32), size of the names (uint32)
+##  names     UTF-8 names of the scopes, each ended by a NUL byte, in order of first use
+##  arrays    kind (uint8, index into KINDS), depth (uint16), name (uint32, index into the names), start line
+##            (uint32) and end line (uint32) of every scope, one array after the other
+##  An end line of 0 marks a scope that was never closed, such as one opened in an alternative branch of a
+##  preprocessor conditional.
+
+
+KINDS = (
+    'module', 'submodule', 'program', 'function', 'subroutine', 'procedure', 'type', 'interface',
+    'associate', 'block', 'do', 'where', 'if', 'select',
+)
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+_PROCEDURE_KINDS = frozenset(('function', 'subroutine', 'procedure'))
+
+MAGIC = b'FFHS'
+VERSION = 1
+_HEADER = struct.Struct('<4sHII')
+_ARRAYS = (('kinds', 'B'), ('depths', 'H'), ('names', 'I'), ('starts', 'I'), ('ends', 'I'))
+
+_CONSTRUCT_NAME_RE = re.compile(r'^\s*(\w+)\s*:(?!:)')
+_UNIT_NAME_RE = re.compile(r'^\s*(?:module|program)\s+(\w+)', re.IGNORECASE)
+_SUBMODULE_NAME_RE = re.compile(r'^\s*submodule\s*\([^)]*\)\s*(\w+)', re.IGNORECASE)
+_PROCEDURE_NAME_RE = re.compile(r'\b(?:function|subroutine|procedure)\s+(\w+)', re.IGNORECASE)
+_TYPE_NAME_RE = re.compile(r'::\s*(\w+)')
+_INTERFACE_NAME_RE = re.compile(r'\binterface\s+([^!&]*?)\s*(?:[!&].*)?$', re.IGNORECASE)
+
+
+class Scope(NamedTuple):
+    kind: str
+    name: str
+    start: int
+    end: int
+    depth: int
+
+
+# Name of a scope opened by a statement, '' for unnamed constructs
+def scope_name(kind, statement):
+    if kind == 'module' or kind == 'program':
+        match = _UNIT_NAME_RE.match(statement)
+    elif kind == 'submodule':
+        match = _SUBMODULE_NAME_RE.match(statement)
+    elif kind in _PROCEDURE_KINDS:
+        match = _PROCEDURE_NAME_RE.search(statement)
+    elif kind == 'type':
+        match = _TYPE_NAME_RE.search(statement)
+    elif kind == 'interface':
+        match = _INTERFACE_NAME_RE.search(statement)
+    else:
+        match = _CONSTRUCT_NAME_RE.match(statement)
+    return match.group(1) if match else ''
+
+
+class ScopeIndex:
+    def __init__(self):
+        self.kinds = array.array('B')
+        self.depths = array.array('H')
+        self.names = array.array('I')
+        self.starts = array.array('I')
+        self.ends = array.array('I')
+        self.name_table = []
+        self._name_codes = {}
+
+    # Record a scope opened by a statement inside the open scopes given, returning the open scopes with it
+    def open(self, kind, statement, line_num, open_scopes):
+        name = scope_name(kind, statement)
+        code = self._name_codes.get(name)
+        if code is None:
+            code = self._name_codes[name] = len(self.name_table)
+            self.name_table.append(name)
+        self.kinds.append(_KIND_CODES[kind])
+        self.depths.append(len(open_scopes))
+        self.names.append(code)
+        self.starts.append(line_num)
+        self.ends.append(0)
+        return open_scopes + (len(self.kinds) - 1,)
+
+    # Close the innermost open scope of a kind, along with any scopes left open inside it, returning the scopes
+    # still open; an end procedure statement closes a function or subroutine too
+    def close(self, kind, line_num, open_scopes):
+        codes = (
+            {_KIND_CODES[procedure_kind] for procedure_kind in _PROCEDURE_KINDS} if kind == 'procedure'
+            else {_KIND_CODES[kind]}
+        )
+        for position in range(len(open_scopes) - 1, -1, -1):
+            if self.kinds[open_scopes[position]] in codes:
+                for index in open_scopes[position:]:
+                    self.ends[index] = line_num
+                return open_scopes[:position]
+        return open_scopes
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __iter__(self):
+        for kind, name, start, end, depth in zip(self.kinds, self.names, self.starts, self.ends, self.depths):
+            yield Scope(KINDS[kind], self.name_table[name], start, end, depth)
+
+    def as_list(self):
+        return [scope._asdict() for scope in self]
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='UTF-8') as f:
+            json.dump(self.as_list(), f)
+
+    def to_bytes(self):
+        names = b''.join(name.encode('UTF-8') + b'\0' for name in self.name_table)
+        parts = [_HEADER.pack(MAGIC, VERSION, len(self), len(names)), names]
+        for attribute, _ in _ARRAYS:
+            values = getattr(self, attribute)
+            if sys.byteorder == 'big':
+                values = array.array(values.typecode, values)
+                values.byteswap()
+            parts.append(values.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, count, names_size = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a scope index")
+        index = cls()
+        offset = _HEADER.size
+        index.name_table = data[offset:offset + names_size].decode('UTF-8').split('\0')[:-1]
+        index._name_codes = {name: code for code, name in enumerate(index.name_table)}
+        offset += names_size
+        for attribute, typecode in _ARRAYS:
+            values = array.array(typecode)
+            size = values.itemsize * count
+            values.frombytes(data[offset:offset + size])
+            if sys.byteorder == 'big':
+                values.byteswap()
+            setattr(index, attribute, values)
+            offset += size
+        return index
+
+    def write_binary(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+
+# Sidecar files an index is written to, next to the file it indexes
+SIDECAR_SUFFIXES = {'json': '.scopes.json', 'binary': '.scopes'}
+
+def write_sidecar(index, filename, index_format):
+    path = filename + SIDECAR_SUFFIXES[index_format]
+    if index_format == 'json':
+        index.write_json(path)
+    else:
+        index.write_binary(path)
+    return path
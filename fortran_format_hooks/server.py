@@ -0,0 +1,320 @@
+import sys
+import json
+import bisect
+import argparse
+import urllib.parse
+import urllib.request
+from typing import Optional, Sequence
+
+from fortran_format_hooks import styles
+from fortran_format_hooks.check_indentation import DEFAULT_STYLE, IndentState
+
+## Language server for on-save and as-you-type indentation diagnostics and formatting.
+##  Speaks the Language Server Protocol over stdio, keeping every open document checked in memory.
+##  After an edit, checking resumes from the nearest state checkpoint before the edit, and stops as
+##  soon as the state after the edit matches a checkpoint from the previous check.
+
+
+CHECKPOINT_INTERVAL = 100
+
+# Diagnostic severities as numbered by the protocol
+_SEVERITIES = {
+    'error': 1,
+    'warning': 2,
+    'note': 3,
+}
+
+_TEXT_DOCUMENT_SYNC_INCREMENTAL = 2
+_METHOD_NOT_FOUND = -32601
+_INVALID_REQUEST = -32600
+
+
+# Split text into lines the way a file read in text mode is, keeping the newlines
+def _split_lines(text):
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    if lines[-1]:
+        return [line + '\n' for line in lines[:-1]] + [lines[-1]]
+    return [line + '\n' for line in lines[:-1]]
+
+def _uri_to_path(uri):
+    parsed = urllib.parse.urlparse(uri)
+    if parsed.scheme != 'file':
+        return uri
+    return urllib.request.url2pathname(urllib.parse.unquote(parsed.path))
+
+
+# An open document and the results of checking it
+class Document:
+    def __init__(self, text, file_path='', line_length=80, relaxed_line_margin=0.1, interval=CHECKPOINT_INTERVAL,
+                 style=None):
+        self.interval = interval
+        self.lines = _split_lines(text)
+        self.positions = [0]  # Indices of the lines before which the checkpoints were taken
+        self.states = [IndentState(file_path, line_length, relaxed_line_margin, style=style)]
+        self.results = []  # Corrected line and diagnostics of each line checked
+        self._recheck(0, len(self.lines), 0)
+
+    # Apply an edit replacing the text between two (line, character) positions
+    def edit(self, start, end, text):
+        start_line, start_character = start
+        end_line, end_character = end
+        first = self.lines[start_line] if start_line < len(self.lines) else ''
+        last = self.lines[end_line] if end_line < len(self.lines) else ''
+        new_lines = _split_lines(first[:start_character] + text + last[end_character:])
+        old_count = min(end_line + 1, len(self.lines)) - start_line
+        self.lines[start_line:start_line + old_count] = new_lines
+        self._recheck(start_line, start_line + len(new_lines), len(new_lines) - old_count)
+
+    # Replace the whole text of the document
+    def replace(self, text):
+        old_count = len(self.lines)
+        self.lines = _split_lines(text)
+        self._recheck(0, len(self.lines), len(self.lines) - old_count)
+
+    # Re-check the document after an edit that changed lines[first_changed:changed_end] and added line_delta lines
+    def _recheck(self, first_changed, changed_end, line_delta):
+        old_positions, old_states, old_results = self.positions, self.states, self.results
+        old_checkpoints = {position: n for n, position in enumerate(old_positions)}
+
+        checkpoint = bisect.bisect_right(old_positions, first_changed) - 1
+        start = old_positions[checkpoint]
+        positions = old_positions[:checkpoint + 1]
+        states = old_states[:checkpoint + 1]
+        results = old_results[:start]
+
+        state = states[-1].copy()
+        index = start
+        while index < len(self.lines):
+            if index > start:
+                ## once past the edit, stop when the state matches that at an earlier checkpoint
+                old_checkpoint = old_checkpoints.get(index - line_delta) if index >= changed_end else None
+                if old_checkpoint is not None and state.resumes_like(old_states[old_checkpoint]):
+                    for old_state in old_states[old_checkpoint:]:
+                        old_state.line_num += line_delta
+                    positions += [position + line_delta for position in old_positions[old_checkpoint:]]
+                    states += old_states[old_checkpoint:]
+                    results += _moved_results(old_results[index - line_delta:], line_delta)
+                    break
+                if index - positions[-1] >= self.interval:
+                    positions.append(index)
+                    states.append(state.copy())
+            corrected, diagnostics = state.feed(self.lines[index])
+            results.append((corrected, diagnostics))
+            index += 1
+            if corrected is None:
+                break
+
+        self.positions, self.states, self.results = positions, states, results
+
+    @property
+    def diagnostics(self):
+        return [diagnostic for _, diagnostics in self.results for diagnostic in diagnostics]
+
+    # Edits that correct the indentation of the document, as (line, start character, end character, text)
+    @property
+    def formatting_edits(self):
+        if self.results and self.results[-1][0] is None:
+            return []
+        edits = []
+        for index, (line, (corrected, _)) in enumerate(zip(self.lines, self.results)):
+            text = line.rstrip('\n')
+            if corrected != text:
+                edits.append((index, 0, len(text), corrected))
+        ## if not present, add newline to end of file
+        if self.lines and not self.lines[-1].endswith('\n') and self.results[-1][0].strip():
+            edits.append((len(self.lines) - 1, len(self.lines[-1]), len(self.lines[-1]), '\n'))
+        return edits
+
+def _moved_results(results, line_delta):
+    if not line_delta:
+        return results
+    moved = []
+    for result in results:
+        corrected, diagnostics = result
+        if diagnostics:
+            result = (corrected, [diagnostic.moved(line_delta) for diagnostic in diagnostics])
+        moved.append(result)
+    return moved
+
+
+#-----------------------------------------------------------------------------------------------
+# Language Server Protocol
+#-----------------------------------------------------------------------------------------------
+def _read_message(stream):
+    headers = {}
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode('ascii').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return json.loads(stream.read(int(headers['content-length'])))
+
+def _write_message(stream, message):
+    body = json.dumps(message, separators=(',', ':')).encode('UTF-8')
+    stream.write(b'Content-Length: %d\r\n\r\n' % len(body))
+    stream.write(body)
+    stream.flush()
+
+def _range(line, start_character, end_character):
+    return {
+        'start': {'line': line, 'character': start_character},
+        'end': {'line': line, 'character': end_character},
+    }
+
+
+# Line lengths given to the server override the style configured for each document
+class LanguageServer:
+    def __init__(self, output, line_length=None, relaxed_line_margin=None, interval=CHECKPOINT_INTERVAL):
+        self.output = output
+        self.line_length = line_length
+        self.relaxed_line_margin = relaxed_line_margin
+        self.interval = interval
+        self.documents = {}
+        self.shutdown = False
+        self.styles = None
+
+    # Style of a document, from the configuration of its directory if it is a file
+    def _style(self, uri):
+        if self.styles is None:
+            self.styles = styles.StyleResolver(
+                DEFAULT_STYLE, {'line_length': self.line_length, 'relaxed_line_margin': self.relaxed_line_margin}
+            )
+        if not uri.startswith('file:'):
+            return self.styles.default._replace(**self.styles.overrides)
+        try:
+            return self.styles.style_for(_uri_to_path(uri))
+        except (OSError, styles.StyleError) as e:
+            self._send({'method': 'window/showMessage', 'params': {'type': 1, 'message': str(e)}})
+            return self.styles.default._replace(**self.styles.overrides)
+
+    def _send(self, message):
+        _write_message(self.output, dict(message, jsonrpc='2.0'))
+
+    def _publish_diagnostics(self, uri):
+        document = self.documents.get(uri)
+        diagnostics = []
+        for diagnostic in (document.diagnostics if document else []):
+            line = diagnostic.line_num - 1
+            diagnostics.append({
+                'range': _range(line, 0, len(document.lines[line].rstrip('\n'))),
+                'severity': _SEVERITIES[diagnostic.severity],
+                'code': diagnostic.rule,
+                'source': 'fortran-format-hooks',
+                'message': diagnostic.message,
+            })
+        self._send({
+            'method': 'textDocument/publishDiagnostics',
+            'params': {'uri': uri, 'diagnostics': diagnostics},
+        })
+
+    # Handle one message, returning False once the client has asked the server to exit
+    def handle(self, message):
+        method = message.get('method')
+        params = message.get('params') or {}
+        if 'id' in message and method is None:
+            return True  # response to a request from the server
+        try:
+            result = self._dispatch(method, params)
+        except _RequestError as e:
+            if 'id' in message:
+                self._send({'id': message['id'], 'error': {'code': e.code, 'message': str(e)}})
+            return True
+        if method == 'exit':
+            return False
+        if 'id' in message:
+            self._send({'id': message['id'], 'result': result})
+        return True
+
+    def _dispatch(self, method, params):
+        if method == 'initialize':
+            options = params.get('initializationOptions') or {}
+            self.line_length = options.get('lineLength', self.line_length)
+            self.relaxed_line_margin = options.get('relaxedLineMargin', self.relaxed_line_margin)
+            self.styles = None
+            return {
+                'capabilities': {
+                    'textDocumentSync': {'openClose': True, 'change': _TEXT_DOCUMENT_SYNC_INCREMENTAL},
+                    'documentFormattingProvider': True,
+                },
+                'serverInfo': {'name': 'fortran-format-hooks'},
+            }
+        if method == 'shutdown':
+            self.shutdown = True
+            return None
+        if method == 'textDocument/didOpen':
+            document = params['textDocument']
+            style = self._style(document['uri'])
+            self.documents[document['uri']] = Document(
+                document['text'], _uri_to_path(document['uri']),
+                style.line_length, style.relaxed_line_margin, self.interval, style
+            )
+            self._publish_diagnostics(document['uri'])
+            return None
+        if method == 'textDocument/didChange':
+            uri = params['textDocument']['uri']
+            document = self.documents.get(uri)
+            if document is None:
+                raise _RequestError(_INVALID_REQUEST, f"Document {uri} is not open")
+            for change in params['contentChanges']:
+                if 'range' in change:
+                    start, end = change['range']['start'], change['range']['end']
+                    document.edit(
+                        (start['line'], start['character']), (end['line'], end['character']), change['text']
+                    )
+                else:
+                    document.replace(change['text'])
+            self._publish_diagnostics(uri)
+            return None
+        if method == 'textDocument/didClose':
+            uri = params['textDocument']['uri']
+            self.documents.pop(uri, None)
+            self._publish_diagnostics(uri)
+            return None
+        if method == 'textDocument/formatting':
+            document = self.documents.get(params['textDocument']['uri'])
+            if document is None:
+                return None
+            return [
+                {'range': _range(line, start_character, end_character), 'newText': text}
+                for line, start_character, end_character, text in document.formatting_edits
+            ]
+        if method in ('initialized', 'exit', 'textDocument/didSave') or (method or '').startswith('$/'):
+            return None
+        raise _RequestError(_METHOD_NOT_FOUND, f"Method not found: {method}")
+
+
+class _RequestError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Fortran indentation language server (stdio).')
+    parser.add_argument(
+        '--line-length', type=int, default=None,
+        help='Maximum line length (overrides the style configuration, 80 by default).',
+    )
+    parser.add_argument(
+        '--relaxed-line-margin', type=float, default=None,
+        help='Leniency for line length check (0.1 = 10%%, overrides the style configuration, 0.1 by default).',
+    )
+    parser.add_argument(
+        '--checkpoint-interval', type=int, default=CHECKPOINT_INTERVAL,
+        help='Number of lines between the checkpoints kept for each open document.',
+    )
+    args = parser.parse_args(argv)
+
+    server = LanguageServer(sys.stdout.buffer, args.line_length, args.relaxed_line_margin, args.checkpoint_interval)
+    while True:
+        message = _read_message(sys.stdin.buffer)
+        if message is None or not server.handle(message):
+            break
+    return 0 if server.shutdown else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+import array
+import hashlib
+
+## Read the lines of source files so that even very large (e.g. generated) files are checked with flat memory use:
+##  lines are read through a buffer one at a time as they are needed, and if they need to be accessed out of order,
+##  only the offsets of the lines are kept, and each line is read again from its offset when it is needed.
+##  Files are never memory mapped, as a file truncated while it is read (by an editor saving it in place) would end
+##  the process with SIGBUS when reading past its new end through a map; read through a buffer, the file just ends.
+
+
+ENCODING = 'UTF-8'
+
+_BLOCK_SIZE = 1 << 20  # bytes read at a time to index a file or digest its lines
+
+
+# The lines of a file, each with its newline, as they would be read from the file in text mode
+class SourceLines:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = None  # The file opened in binary mode, only kept open to access its lines out of order
+        self._offsets = None  # Offsets of the start of each line, and of the end of the file
+        self._lines = None  # Lines read in text mode, for files that cannot be split on newlines in place
+
+    def _read_text(self):
+        with open(self.file_path, 'r', encoding=ENCODING) as f:
+            self._lines = f.readlines()
+
+    def __iter__(self):
+        if self._lines is not None:
+            yield from self._lines
+            return
+        with open(self.file_path, 'r', encoding=ENCODING) as f:
+            yield from f
+
+    def _index(self):
+        if self._offsets is not None or self._lines is not None:
+            return
+        f = self._file = open(self.file_path, 'rb')
+        offsets = array.array('q', [0])
+        end = 0
+        while True:
+            block = f.read(_BLOCK_SIZE)
+            if not block:
+                break
+            ## only plain newlines can be indexed in place, other line endings are left to text mode
+            if b'\r' in block:
+                self.close()
+                self._read_text()
+                return
+            newline = block.find(b'\n')
+            while newline != -1:
+                offsets.append(end + newline + 1)
+                newline = block.find(b'\n', newline + 1)
+            end += len(block)
+        if end == 0:
+            self.close()
+            self._lines = []
+            return
+        if offsets[-1] != end:
+            offsets.append(end)
+        self._offsets = offsets
+
+    def __len__(self):
+        self._index()
+        if self._lines is not None:
+            return len(self._lines)
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        self._index()
+        if self._lines is not None:
+            return self._lines[index]
+        offsets = self._offsets
+        if index < 0:
+            index += len(offsets) - 1
+        if not 0 <= index < len(offsets) - 1:
+            raise IndexError('line index out of range')
+        self._file.seek(offsets[index])
+        return self._file.read(offsets[index + 1] - offsets[index]).decode(ENCODING)
+
+    # Digests of the contents of the file before each of line_nums (line numbers from 1 to one past the last line,
+    # in increasing order), which tell whether the lines before a line are those a digest was taken of
+    def prefix_digests(self, line_nums):
+        self._index()
+        digest = hashlib.blake2b(digest_size=16)
+        digests = []
+        start = 0
+        if self._offsets is not None:
+            self._file.seek(0)
+        for line_num in line_nums:
+            if self._lines is not None:
+                digest.update(''.join(self._lines[start:line_num - 1]).encode(ENCODING))
+            else:
+                remaining = self._offsets[line_num - 1] - self._offsets[start]
+                while remaining > 0:
+                    block = self._file.read(min(remaining, _BLOCK_SIZE))
+                    if not block:
+                        break
+                    digest.update(block)
+                    remaining -= len(block)
+            start = line_num - 1
+            digests.append(digest.copy().hexdigest())
+        return digests
+
+    # Iterate over the lines from index start up to (not including) stop
+    def range(self, start, stop):
+        self._index()
+        if self._lines is not None:
+            yield from self._lines[start:stop]
+            return
+        offsets = self._offsets
+        start = max(start, 0)
+        stop = min(stop, len(offsets) - 1)
+        if start >= stop:
+            return
+        ## the lines are read in order through the buffer of the file, seeking back to the next line each time as
+        ##  lines may be read out of order in between (seeking within the buffer reads nothing)
+        f = self._file
+        position = offsets[start]
+        for _ in range(start, stop):
+            f.seek(position)
+            line = f.readline()
+            if not line:
+                return
+            position += len(line)
+            yield line.decode(ENCODING)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,158 @@
+import os
+import configparser
+from typing import NamedTuple
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+## Style profiles, giving the indentation widths and line lengths that files are checked against.
+##  A profile is read from the configuration files of the directory a file is in and of each directory
+##  above it, with settings in nearer directories overriding those further up. Configuration is read from:
+##    .fortran-format-hooks.cfg   [fortran-format-hooks] section
+##    pyproject.toml              [tool.fortran-format-hooks] table
+##    setup.cfg                   [fortran-format-hooks] section
+##  taking the first of these in a directory that has the section. Setting "root = true" stops the search
+##  for configuration in the directories above.
+##
+## Example:
+##  [fortran-format-hooks]
+##  loop-conditional-indent = 2
+##  continuation-indent = 4
+##  line-length = 100
+
+
+SECTION = 'fortran-format-hooks'
+CONFIG_FILE = '.fortran-format-hooks.cfg'
+
+
+# The widths and lengths of a style, which are immutable so a resolved style can be shared by every file using it
+class Style(NamedTuple):
+    procedure_indent: int
+    module_program_indent: int
+    loop_conditional_indent: int
+    continuation_indent: int
+    line_length: int
+    relaxed_line_margin: float
+
+
+class StyleError(ValueError):
+    pass
+
+
+def _non_negative(convert):
+    def parse(value):
+        value = convert(value)
+        if value < 0:
+            raise ValueError(f"{value} is negative")
+        return value
+    return parse
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ('1', 'yes', 'true', 'on'):
+        return True
+    if str(value).lower() in ('0', 'no', 'false', 'off'):
+        return False
+    raise ValueError(f"{value!r} is not a boolean")
+
+_SETTINGS = {
+    'procedure_indent': _non_negative(int),
+    'module_program_indent': _non_negative(int),
+    'loop_conditional_indent': _non_negative(int),
+    'continuation_indent': _non_negative(int),
+    'line_length': _non_negative(int),
+    'relaxed_line_margin': _non_negative(float),
+    'root': _boolean,
+}
+
+
+# Read the settings in the configuration of one directory, returning None if it has none
+def read_directory_settings(directory):
+    config_path = os.path.join(directory, CONFIG_FILE)
+    if os.path.isfile(config_path):
+        settings = _read_cfg(config_path)
+        if settings is not None:
+            return _parsed(settings, config_path)
+    config_path = os.path.join(directory, 'pyproject.toml')
+    if os.path.isfile(config_path):
+        settings = _read_pyproject(config_path)
+        if settings is not None:
+            return _parsed(settings, config_path)
+    config_path = os.path.join(directory, 'setup.cfg')
+    if os.path.isfile(config_path):
+        settings = _read_cfg(config_path)
+        if settings is not None:
+            return _parsed(settings, config_path)
+    return None
+
+def _read_cfg(config_path):
+    parser = configparser.ConfigParser()
+    try:
+        parser.read(config_path, encoding='UTF-8')
+    except configparser.Error as e:
+        raise StyleError(f"could not read {config_path}: {e}") from e
+    if not parser.has_section(SECTION):
+        return None
+    return dict(parser.items(SECTION))
+
+def _read_pyproject(config_path):
+    with open(config_path, 'rb') as f:
+        contents = f.read()
+    if tomllib is None:
+        ## without a TOML parser, only complain if there is configuration being missed
+        if f'[tool.{SECTION}]'.encode() in contents:
+            raise StyleError(f"reading the configuration in {config_path} needs Python 3.11 or tomli")
+        return None
+    try:
+        pyproject = tomllib.loads(contents.decode('UTF-8'))
+    except (tomllib.TOMLDecodeError, UnicodeDecodeError) as e:
+        raise StyleError(f"could not read {config_path}: {e}") from e
+    return pyproject.get('tool', {}).get(SECTION)
+
+def _parsed(settings, config_path):
+    parsed = {}
+    for name, value in settings.items():
+        key = name.replace('-', '_')
+        if key not in _SETTINGS:
+            raise StyleError(f"unknown setting {name} in {config_path}")
+        try:
+            parsed[key] = _SETTINGS[key](value)
+        except (TypeError, ValueError) as e:
+            raise StyleError(f"invalid value for {name} in {config_path}: {e}") from e
+    return parsed
+
+
+# Resolves the style of files from the configuration of their directories, reading the configuration of each
+# directory once and keeping the style resolved for each directory
+# overrides (e.g. from the command line) take precedence over any configuration
+class StyleResolver:
+    def __init__(self, default, overrides=None):
+        self.default = default
+        self.overrides = {name: value for name, value in (overrides or {}).items() if value is not None}
+        self._settings = {}  # directory -> settings resolved from it and the directories above it
+        self._styles = {}  # directory -> Style
+
+    def style_for(self, filename):
+        directory = os.path.dirname(os.path.abspath(filename))
+        style = self._styles.get(directory)
+        if style is None:
+            settings = dict(self._resolved_settings(directory), **self.overrides)
+            settings.pop('root', None)
+            style = self._styles[directory] = self.default._replace(**settings)
+        return style
+
+    def _resolved_settings(self, directory):
+        settings = self._settings.get(directory)
+        if settings is None:
+            settings = read_directory_settings(directory) or {}
+            parent = os.path.dirname(directory)
+            if not settings.get('root') and parent != directory:
+                settings = dict(self._resolved_settings(parent), **settings)
+            self._settings[directory] = settings
+        return settings
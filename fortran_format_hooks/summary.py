@@ -0,0 +1,87 @@
+import heapq
+
+## Totals for a whole run of the hook: how many files were checked, skipped, failed and fixed, the diagnostics
+##  found by each rule, and the files that took the longest to check, to spot sources whose shape makes the
+##  check slow and to follow the cost of the hook over time.
+
+
+class RunSummary:
+    def __init__(self, slowest=10):
+        self.slowest = slowest
+        self.checked = 0
+        self.cached = 0  # Checked files whose results were replayed from the cache
+        self.skipped = 0
+        self.failed = 0
+        self.fixed = 0
+        self.lines = 0
+        self.check_seconds = 0.0  # Time spent checking files, summed over the processes checking them
+        self.wall_seconds = 0.0
+        self.rules = {}  # rule -> count of diagnostics
+        self._timings = []  # heap of (seconds, lines, filename) of the slowest files
+
+    def skip(self, filename):
+        self.skipped += 1
+
+    # Record a checked file, with its (lines, seconds) timing or None if its result was cached
+    def check(self, filename, success, fixed, diagnostics, timing=None):
+        self.checked += 1
+        self.failed += not success
+        self.fixed += bool(fixed)
+        for diagnostic in diagnostics:
+            self.rules[diagnostic.rule] = self.rules.get(diagnostic.rule, 0) + 1
+        if timing is None:
+            self.cached += 1
+            return
+        lines, seconds = timing
+        self.lines += lines
+        self.check_seconds += seconds
+        if self.slowest > 0:
+            entry = (seconds, lines, filename)
+            if len(self._timings) < self.slowest:
+                heapq.heappush(self._timings, entry)
+            elif entry > self._timings[0]:
+                heapq.heapreplace(self._timings, entry)
+
+    # The slowest files, slowest first, as (filename, lines, seconds)
+    def slowest_files(self):
+        return [(filename, lines, seconds) for seconds, lines, filename in sorted(self._timings, reverse=True)]
+
+    def as_dict(self):
+        return {
+            'files': {
+                'checked': self.checked,
+                'cached': self.cached,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'fixed': self.fixed,
+            },
+            'lines': self.lines,
+            'check_seconds': self.check_seconds,
+            'wall_seconds': self.wall_seconds,
+            'rules': dict(sorted(self.rules.items())),
+            'slowest': [
+                {'file': filename, 'lines': lines, 'seconds': seconds, 'lines_per_second': _rate(lines, seconds)}
+                for filename, lines, seconds in self.slowest_files()
+            ],
+        }
+
+    def table(self):
+        rows = [
+            f"Checked {self.checked} files ({self.cached} cached), skipped {self.skipped}, "
+            f"failed {self.failed}, fixed {self.fixed}",
+            f"Checked {self.lines} lines in {self.check_seconds:.2f} s, {self.wall_seconds:.2f} s wall time",
+        ]
+        if self.rules:
+            rows.append(f"  {'rule':<24}{'diagnostics':>12}")
+            for rule, count in sorted(self.rules.items(), key=lambda item: item[1], reverse=True):
+                rows.append(f"  {rule:<24}{count:>12}")
+        slowest = self.slowest_files()
+        if slowest:
+            rows.append(f"  {'slowest files':<48}{'lines':>10}{'ms':>11}{'lines/s':>12}")
+            for filename, lines, seconds in slowest:
+                rows.append(f"  {filename:<48}{lines:>10}{seconds * 1e3:>11.2f}{_rate(lines, seconds):>12.0f}")
+        return "\n".join(rows)
+
+
+def _rate(lines, seconds):
+    return lines / seconds if seconds else 0.0
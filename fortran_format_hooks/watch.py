@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+## Watch source trees for changed files, through inotify on Linux or by polling the modification times and sizes
+##  of the files elsewhere. A burst of changes (saving several files at once, switching branches) is gathered
+##  into one batch, handed over once no change has been seen for a short while.
+
+
+POLL_INTERVAL = 1.0  # seconds between scans of the files when polling
+
+## inotify event masks, from <sys/inotify.h>
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (
+    _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR
+)
+_EVENT = struct.Struct('iIII')  # watch descriptor, mask, cookie, length of the name that follows
+## errors of inotify_add_watch that mean no more directories can be watched, rather than that one cannot be
+_LIMIT_ERRORS = (errno.ENOSPC, errno.ENOMEM)
+
+
+# Watch directories with inotify, the whole tree below each of trees and only the files directly in each of
+# directories
+# include_directory(path) tells whether to watch a directory found in a tree, and list_files() lists all the
+# watched files, which are all taken as changed if the kernel drops events
+# Raises OSError if inotify is not available or cannot watch every directory, typically as there are more than
+# fs.inotify.max_user_watches
+class InotifyWatcher:
+    def __init__(self, trees, directories, include_directory, list_files):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._include_directory = include_directory
+        self._list_files = list_files
+        self._directories = {}  # watch descriptor -> (directory, whether the tree below it is watched)
+        try:
+            for tree in trees:
+                self._add_tree(tree)
+            for directory in directories:
+                self._add(directory, False)
+        except OSError:
+            self.close()
+            raise
+
+    def _add(self, directory, recursive):
+        watch = self._add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if watch < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise OSError(
+                    error, f"cannot watch {directory}, too many directories (see fs.inotify.max_user_watches)"
+                )
+            if error in _LIMIT_ERRORS:
+                raise OSError(error, f"cannot watch {directory}: {os.strerror(error)}")
+            ## directories that vanished or cannot be read are left out
+            return
+        ## a directory already watched with the tree below it keeps being so
+        if recursive or watch not in self._directories:
+            self._directories[watch] = (directory, recursive)
+
+    # Watch a tree, returning the files already in it
+    def _add_tree(self, tree):
+        files = []
+        self._add(tree, True)
+        try:
+            with os.scandir(tree) as scan:
+                entries = list(scan)
+        except OSError:
+            return files
+        for entry in entries:
+            path = os.path.normpath(entry.path)
+            if entry.is_dir(follow_symlinks=False):
+                if self._include_directory(path + os.sep):
+                    files += self._add_tree(path)
+            else:
+                files.append(path)
+        return files
+
+    # Wait up to timeout seconds (forever if None) for changes, returning the set of paths changed
+    def wait(self, timeout=None):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 1 << 16)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    return changed
+                raise
+            offset = 0
+            while offset < len(data):
+                watch, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & _IN_Q_OVERFLOW:
+                    changed.update(self._list_files())
+                    continue
+                if mask & _IN_IGNORED:
+                    self._directories.pop(watch, None)
+                    continue
+                if watch not in self._directories or not name:
+                    continue
+                directory, recursive = self._directories[watch]
+                path = os.path.normpath(os.path.join(directory, name))
+                if not mask & _IN_ISDIR:
+                    changed.add(path)
+                elif recursive and mask & ( _IN_CREATE | _IN_MOVED_TO ) and self._include_directory(path + os.sep):
+                    ## files created in a new directory before it was watched would go unnoticed otherwise
+                    try:
+                        changed.update(self._add_tree(path))
+                    except OSError as e:
+                        print(f"Warning: changes in {path} may go unnoticed, as inotify {e.strerror}", file=sys.stderr)
+
+    def close(self):
+        os.close(self._fd)
+
+
+# Watch the files listed by list_files() by comparing their modification times and sizes every interval seconds
+class PollingWatcher:
+    def __init__(self, list_files, interval=POLL_INTERVAL):
+        self._list_files = list_files
+        self.interval = interval
+        self._stamps = self._scan()
+
+    def _scan(self):
+        stamps = {}
+        for path in self._list_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stamps[os.path.normpath(path)] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    # Wait up to timeout seconds (forever if None) for changes, returning the set of paths changed
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.monotonic())))
+            stamps = self._scan()
+            changed = {path for path in stamps.keys() | self._stamps.keys() if stamps.get(path) != self._stamps.get(path)}
+            self._stamps = stamps
+            if changed or ( deadline is not None and time.monotonic() >= deadline ):
+                return changed
+
+    def close(self):
+        pass
+
+
+# Watch with inotify where it is available and by polling otherwise (or if poll is True)
+def open_watcher(trees, directories, include_directory, list_files, poll=False):
+    if not poll and hasattr(os, 'O_CLOEXEC') and ctypes.util.find_library('c'):
+        try:
+            return InotifyWatcher(trees, directories, include_directory, list_files)
+        except AttributeError:
+            ## no inotify in this C library
+            pass
+        except OSError as e:
+            ## no more inotify instances or watches allowed
+            print(f"Warning: watching by polling, as inotify failed: {e.strerror}", file=sys.stderr)
+    return PollingWatcher(list_files)
+
+
+# Yield the sets of paths changed, each burst of changes as one set, once no change has been seen for debounce
+# seconds
+def batches(watcher, debounce=0.2):
+    while True:
+        changed = watcher.wait()
+        if not changed:
+            continue
+        while True:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            changed |= more
+        yield changed
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from fortran_format_hooks.check_indentation import (
+    DEFAULT_STYLE, IndentState, checkpoints, _dump_checkpoints, _load_checkpoints,
+)
+
+## Checkpoints are cached as plain data: a state read back from its data resumes the check as the state itself
+##  would, and data that is not that of a state is dropped rather than trusted.
+
+
+SOURCE = (
+    "module m\n"
+    "  implicit none\n"
+    "contains\n"
+    "#ifdef DOUBLE\n"
+    "  subroutine s(x)\n"
+    "    real(8) :: x\n"
+    "#else\n"
+    "  subroutine s(x)\n"
+    "    real :: x\n"
+    "#endif\n"
+    "    x = x + &\n"
+    "         (1.0 + &\n"
+    "         2.0)\n"
+    "#if defined(A)\n"
+    "#ifdef B\n"
+    "    do\n"
+    "#elif C\n"
+    "    do while (.true.)\n"
+    "#endif\n"
+    "       exit\n"
+    "    end do\n"
+    "#endif\n"
+    "    print *, 'it''s (', x\n"
+    "  end subroutine s\n"
+    "end module m\n"
+)
+
+
+def test_states_round_trip():
+    lines = SOURCE.splitlines(True)
+    states = checkpoints(lines, 'm.f90', interval=1)
+    assert any(state.conditionals for state in states)
+    for state in states:
+        read = IndentState.from_data(json.loads(json.dumps(state.to_data())), 'm.f90', style=DEFAULT_STYLE)
+        assert read == state
+        assert [read.copy().feed(line) for line in lines[state.line_num - 1:]] == [
+            state.copy().feed(line) for line in lines[state.line_num - 1:]
+        ]
+
+def test_checkpoints_round_trip():
+    states = checkpoints(SOURCE.splitlines(True), 'm.f90', interval=3)
+    saved = [(state.line_num, f'digest {state.line_num}', state) for state in states]
+    assert _load_checkpoints(_dump_checkpoints(saved), 'm.f90', DEFAULT_STYLE) == saved
+
+@pytest.mark.parametrize('data', [
+    b'', b'not json', b'{}', b'[1]', b'[[1, "digest"]]', b'[["1", "digest", [1, true, [], []]]]',
+    b'[[1, "digest", [1, true, [], []]]]', b'[[1, "digest", [0, true, [], []]]]',
+    b'\x80\x04\x95', json.dumps([[1, "digest", [1, True, ["0"] * 30, []]]]).encode(),
+])
+def test_bad_checkpoints_are_dropped(data):
+    assert _load_checkpoints(data, 'm.f90', DEFAULT_STYLE) == []
@@ -0,0 +1,92 @@
+from fortran_format_hooks import check_indentation
+
+## Fixed-form sources are indented from column 7, with statement labels in columns 1-5: labelled DO loops end at
+##  the statement with their label, which may end several loops at once or be an action statement of the loop,
+##  a bare END closes the procedure or program it is in, and anything but a label in the label field is an error.
+
+
+def _check(tmp_path, source):
+    path = tmp_path / 'source.f'
+    path.write_text(source)
+    diagnostics = []
+    corrected = []
+    (success, complete), _ = check_indentation._drain(
+        check_indentation.iter_corrected_lines(str(path), diagnostics=diagnostics, fixed_form=True),
+        corrected.append
+    )
+    assert complete
+    return success, [(diagnostic.line_num, diagnostic.rule, diagnostic.expected, diagnostic.found)
+                     for diagnostic in diagnostics], "".join(corrected)
+
+
+SHARED_TERMINAL = (
+    "      PROGRAM P\n"
+    "        INTEGER I, J\n"
+    "        DO 10 I = 1, 3\n"
+    "           DO 10 J = 1, 3\n"
+    "              PRINT *, I, J\n"
+    "   10   CONTINUE\n"
+    "        DO 20 I = 1, 3\n"
+    "           X = I\n"
+    "   20      X = X + 1\n"
+    "        PRINT *, X\n"
+    "      END\n"
+)
+
+PROCEDURES = (
+    "C     A COMMENT\n"
+    "      FUNCTION F(X)\n"
+    "*       STAR COMMENT\n"
+    "        F = X +\n"
+    "     &       1.0\n"
+    "      END\n"
+    "      SUBROUTINE S(N)\n"
+    "        INTEGER N, I\n"
+    "        DO 10 I = 1, N\n"
+    "           IF (I .GT. 2) THEN\n"
+    "              CALL G(I)\n"
+    "           END IF\n"
+    "   10   CONTINUE\n"
+    "        DO 30 I = 1, N\n"
+    "           DO 20 J = 1, N\n"
+    "              X = X + 1\n"
+    "   20      CONTINUE\n"
+    "   30   CONTINUE\n"
+    "      END\n"
+)
+
+
+def test_shared_terminal_statement_passes(tmp_path):
+    assert _check(tmp_path, SHARED_TERMINAL) == (True, [], SHARED_TERMINAL)
+
+def test_shared_terminal_statement_is_fixed(tmp_path):
+    source = (
+        "      PROGRAM P\n"
+        "      INTEGER I, J\n"
+        "      DO 10 I = 1, 3\n"
+        "      DO 10 J = 1, 3\n"
+        "      PRINT *, I, J\n"
+        "   10 CONTINUE\n"
+        "      DO 20 I = 1, 3\n"
+        "      X = I\n"
+        "   20 X = X + 1\n"
+        "      PRINT *, X\n"
+        "      END\n"
+    )
+    success, diagnostics, corrected = _check(tmp_path, source)
+    assert not success
+    assert [line_num for line_num, _, _, _ in diagnostics] == [2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert corrected == SHARED_TERMINAL
+
+def test_procedures_end_at_bare_end(tmp_path):
+    assert _check(tmp_path, PROCEDURES) == (True, [], PROCEDURES)
+
+def test_body_after_bare_end_is_not_nested(tmp_path):
+    source = PROCEDURES.replace("        INTEGER N, I\n", "           INTEGER N, I\n")
+    assert _check(tmp_path, source) == (False, [(8, 'indentation', 2, 5)], PROCEDURES)
+
+def test_label_field_error(tmp_path):
+    source = SHARED_TERMINAL.replace("        PRINT *, X\n", "   X    PRINT *, X\n")
+    success, diagnostics, _ = _check(tmp_path, source)
+    assert not success
+    assert diagnostics == [(10, 'label-field', None, 'X')]
@@ -0,0 +1,128 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from fortran_format_hooks import check_indentation
+
+## The diff printed by --diff must be the fix --autofix writes: applied with patch, it must give the same files.
+
+
+SOURCES = {
+    'program.f90': (
+        "program p\n"
+        "implicit none\n"
+        "integer :: i\n"
+        "do i=1,3\n"
+        "print *, i\n"
+        "end do\n"
+        "end program p\n"
+    ),
+    ## changes far enough apart to give several hunks, with lines already right between them
+    'module.f90': (
+        "module m\n"
+        "  implicit none\n"
+        "contains\n"
+        "    subroutine s(x)\n"
+        + "    real :: x\n" * 12
+        + "      x = x + 1\n"
+        + "  x = 2*x\n" * 12
+        + "    end subroutine s\n"
+        "  function f(y) result(z)\n"
+        "    real :: y, z\n"
+        "    if (y > 0) then\n"
+        "  z = y\n"
+        "    else\n"
+        "         z = -y\n"
+        "    end if\n"
+        "  end function f\n"
+        "end module m\n"
+    ),
+    'crlf.f90': "program p\r\nimplicit none\r\n  integer :: i\r\nend program p\r\n",
+    'no_newline.f90': "program p\nimplicit none\nprint *, 1\nend program p",
+    'last_line.f90': "program p\n  implicit none\n  print *, 1\n    end program p",
+    'correct.f90': "program p\n  implicit none\nend program p\n",
+    'fixed.f': (
+        "      PROGRAM P\n"
+        "      INTEGER I\n"
+        "      DO 10 I = 1, 3\n"
+        "      PRINT *, I\n"
+        "   10 CONTINUE\n"
+        "      END\n"
+    ),
+}
+
+
+def _write_sources(directory):
+    directory.mkdir()
+    for filename, source in SOURCES.items():
+        (directory / filename).write_bytes(source.encode())
+
+
+def _diffs(capsys, filenames):
+    capsys.readouterr()
+    check_indentation.main(['--no-cache', '--diff', '--format', 'json', *filenames])
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return {result['file']: result['diff'] for result in results if 'diff' in result}
+
+
+@pytest.mark.skipif(shutil.which('patch') is None, reason="needs patch")
+def test_diff_applies_to_autofix(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    filenames = sorted(SOURCES)
+
+    _write_sources(tmp_path / 'fixed')
+    monkeypatch.chdir(tmp_path / 'fixed')
+    check_indentation.main(['--no-cache', '--autofix', *filenames])
+
+    _write_sources(tmp_path / 'patched')
+    monkeypatch.chdir(tmp_path / 'patched')
+    diffs = _diffs(capsys, filenames)
+    assert 'correct.f90' not in diffs
+    for filename, diff in diffs.items():
+        subprocess.run(
+            ['patch', '--batch', '--binary', '-p1', '--quiet'],
+            input=diff.encode(), cwd=tmp_path / 'patched', check=True,
+        )
+
+    for filename in filenames:
+        fixed = (tmp_path / 'fixed' / filename).read_bytes()
+        assert (tmp_path / 'patched' / filename).read_bytes() == fixed, filename
+        assert (fixed != SOURCES[filename].encode()) == (filename in diffs), filename
+    ## applying the diffs leaves nothing more to fix
+    assert _diffs(capsys, filenames) == {}
+
+
+## A file that cannot be read fails on its own, and the fixes of the other files are still made and announced
+def test_unreadable_file_does_not_stop_fixes(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'bad.f90').write_text(SOURCES['program.f90'])
+    (tmp_path / 'latin.f90').write_bytes(b"program p\n  x = 1\n  ! caf\xe9\nend program p\n")
+    assert check_indentation.main(['--no-cache', '--autofix', 'bad.f90', 'latin.f90', 'missing.f90']) == 1
+    out = capsys.readouterr().out
+    assert "Fixing file bad.f90\n" in out
+    assert "Could not read latin.f90: byte 0xe9 is not valid UTF-8\nlatin.f90 failed indentation check.\n" in out
+    assert "Could not read missing.f90: No such file or directory\n" in out
+    assert (tmp_path / 'bad.f90').read_text() != SOURCES['program.f90']
+
+    check_indentation.main(['--no-cache', '--format', 'json', 'latin.f90'])
+    diagnostic, = json.loads(capsys.readouterr().out)['diagnostics']
+    assert (diagnostic['line'], diagnostic['rule'], diagnostic['severity']) == (3, 'unreadable', 'error')
+
+## A fix is only announced once it is written
+def test_unwritable_fix_is_not_announced(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'bad.f90').write_text(SOURCES['program.f90'])
+    def replace(filename, temp_path):
+        raise PermissionError(13, "Permission denied")
+    monkeypatch.setattr(check_indentation.fixes, 'replace', replace)
+    assert check_indentation.main(['--no-cache', '--autofix', 'bad.f90']) == 1
+    out = capsys.readouterr().out
+    assert "Fixing file" not in out
+    assert "Could not write the fix of bad.f90: Permission denied\nbad.f90 failed indentation check.\n" in out
+    assert (tmp_path / 'bad.f90').read_text() == SOURCES['program.f90']
+    ## the staged fix is not left behind
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['bad.f90']
@@ -0,0 +1,76 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from fortran_format_hooks import git_changes
+from fortran_format_hooks import check_indentation
+
+## The lines changed since a ref must be found for every file, whatever git does to its name in the diff, and
+##  files git does not track, ignored ones included, must be checked in full.
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason="needs git")
+
+
+ORIGINAL = "program p\n  x = 1\n  y = 1\nend program p\n"
+CHANGED = "program p\n x = 2\n  y = 1\nend program p\n"
+NAMES = ['plain.f90', 'sp ace.f90', 'q"uote.f90', 'back\\slash.f90', 'tab\tbed.f90', 'é.f90']
+
+
+def _git(repository, *args):
+    subprocess.run(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+        cwd=repository, check=True, capture_output=True,
+    )
+
+
+@pytest.fixture
+def repository(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    repository = tmp_path / 'repository'
+    (repository / 'src').mkdir(parents=True)
+    (repository / 'gen').mkdir()
+    (repository / 'sub').mkdir()
+    (repository / '.gitignore').write_text("gen/\n")
+    for name in NAMES + ['unchanged.f90']:
+        (repository / 'src' / name).write_text(ORIGINAL, encoding='UTF-8')
+    _git(repository, 'init', '-q')
+    _git(repository, 'add', '-A')
+    _git(repository, 'commit', '-q', '-m', 'initial')
+    for name in NAMES:
+        (repository / 'src' / name).write_text(CHANGED, encoding='UTF-8')
+    (repository / 'gen' / 'generated.f90').write_text(CHANGED)
+    (repository / 'src' / 'untracked.f90').write_text(CHANGED)
+    ## run from a subdirectory, as the paths in the diff are relative to the top of the work tree
+    monkeypatch.chdir(repository / 'sub')
+    return repository
+
+
+def test_changed_line_ranges(repository):
+    filenames = [os.path.join('..', 'src', name) for name in NAMES]
+    changed_ranges = git_changes.changed_line_ranges('HEAD', filenames + [
+        '../src/unchanged.f90', '../src/untracked.f90', '../gen/generated.f90',
+    ])
+    for filename in filenames:
+        assert changed_ranges[os.path.abspath(filename)] == [(2, 2)], filename
+    assert changed_ranges[os.path.abspath('../src/unchanged.f90')] == []
+    assert changed_ranges[os.path.abspath('../src/untracked.f90')] is None
+    assert changed_ranges[os.path.abspath('../gen/generated.f90')] is None
+
+def test_added_lines_looking_like_headers(repository):
+    ## with no context, an added "++ b/..." line and a removed "-- a/..." line read as "+++ b/..." and "--- a/..."
+    (repository / 'src' / 'plain.f90').write_text("program p\n-- a/src/unchanged.f90\n++ b/src/unchanged.f90\n")
+    changed_ranges = git_changes.changed_line_ranges('HEAD', ['../src/plain.f90', '../src/unchanged.f90'])
+    assert changed_ranges[os.path.abspath('../src/plain.f90')] == [(2, 3)]
+    assert changed_ranges[os.path.abspath('../src/unchanged.f90')] == []
+
+@pytest.mark.parametrize('filename', ['../src/sp ace.f90', '../src/q"uote.f90', '../gen/generated.f90'])
+def test_changed_lines_are_checked(repository, filename, capsys):
+    assert check_indentation.main(['--changed-lines-from', 'HEAD', filename]) == 1
+    assert "line 2: Expected 2 spaces, found 1" in capsys.readouterr().out
+
+def test_unquote():
+    assert git_changes._unquote('b/plain.f90') == 'b/plain.f90'
+    assert git_changes._unquote(r'"b/q\"uote\\d.f90"') == 'b/q"uote\\d.f90'
+    assert git_changes._unquote(r'"b/tab\tbed\303\251.f90"') == 'b/tab\tbedé.f90'
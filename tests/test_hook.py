@@ -0,0 +1,132 @@
+import random
+
+import pytest
+
+from fortran_format_hooks import hook
+from fortran_format_hooks import check_indentation
+
+## The fast path of the hook must never skip a run that the full parser of check_indentation.main would give
+##  files to check, output or an error: whenever nothing_to_check is True, the full parser must accept the
+##  arguments, select no file with a checked extension, and main must print nothing and pass.
+
+
+CASES = [
+    [],
+    ['README.md'],
+    ['README.md', 'setup.cfg'],
+    ['a.f90'],
+    ['a.F90'],
+    ['a.f'],
+    ['a.FOR'],
+    ['a.f77'],
+    ['-'],
+    ['--line-length', '100', 'a.txt'],
+    ['--line-length=100', 'a.txt'],
+    ['--line-length', 'abc', 'a.txt'],
+    ['--line-length'],
+    ['--line-length', '-5', 'a.txt'],
+    ['--relaxed-line-margin', '0.2', 'a.txt'],
+    ['--relaxed-line-margin', 'x'],
+    ['--autofix', 'a.txt'],
+    ['--autofix', '--diff', 'a.txt'],
+    ['--diff', '--format', 'sarif', 'a.txt'],
+    ['--format', 'text', 'a.txt'],
+    ['--format', 'json', 'a.txt'],
+    ['--format', 'sarif', 'a.txt'],
+    ['--format', 'xml', 'a.txt'],
+    ['--extensions', '.txt', 'a.f90'],
+    ['--extensions', '.txt', '--', 'a.f90'],
+    ['--extensions', 'a.txt'],
+    ['--extensions'],
+    ['--extensions=.py', 'a.f90'],
+    ['a.py', '--extensions', '.py'],
+    ['--fixed-form-extensions', 'a.f'],
+    ['--fixed-form-extensions', 'a.f', 'b.f90'],
+    ['--fixed-form-extensions'],
+    ['--ignore-patterns', 'a', 'b', 'c.txt'],
+    ['--ignore-patterns', '.*', 'a.f90'],
+    ['--ignore-directories', 'build/', 'build/a.f90'],
+    ['--recursive', 'src'],
+    ['--jobs', '4', 'a.txt'],
+    ['-j', '4', 'a.txt'],
+    ['-j4', 'a.txt'],
+    ['--cache-dir'],
+    ['--cache-dir', '--no-cache'],
+    ['--no-cache', 'a.txt'],
+    ['--no-cache=1'],
+    ['--max-cache-entries', '10', 'a.txt'],
+    ['--changed-lines-from', 'HEAD', 'a.txt'],
+    ['--changed-lines-from', 'HEAD', '--scope-index', 'json', 'a.txt'],
+    ['--scope-index', 'binary', 'a.txt'],
+    ['--scope-index', 'xml'],
+    ['--summary'],
+    ['--summary-json', 'summary.json'],
+    ['--profile', 'a.txt'],
+    ['--slowest', '3', 'a.txt'],
+    ['--watch', 'a.txt'],
+    ['--line-len', '100', 'a.txt'],
+    ['-h'],
+    ['--help'],
+    ['--', 'a.txt'],
+]
+
+# Tokens random command lines are made of
+TOKENS = [
+    'a.f90', 'b.F90', 'c.f', 'd.for', 'e.txt', 'f.py', 'g', '-', '--', '.f90', '.F', '.txt', '.py', '100', '-5', 'x',
+    '0.2', 'text', 'json', 'sarif', 'binary', 'HEAD', '--line-length', '--line-length=90', '--relaxed-line-margin',
+    '--autofix', '--diff', '--ignore-patterns', '--ignore-directories', '--recursive', '--extensions',
+    '--extensions=.txt', '--fixed-form-extensions', '--jobs', '-j', '--cache-dir', '--max-cache-entries',
+    '--no-cache', '--changed-lines-from', '--profile', '--format', '--format=json', '--scope-index', '--summary',
+    '--slowest', '--watch', '--line-len',
+]
+
+
+def _random_cases(count, seed=0):
+    generator = random.Random(seed)
+    return [[generator.choice(TOKENS) for _ in range(generator.randint(0, 6))] for _ in range(count)]
+
+
+def _assert_nothing_checked(argv, capsys):
+    parser = check_indentation._argument_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit:
+        pytest.fail(f"nothing_to_check accepted arguments the full parser rejects: {argv}")
+    capsys.readouterr()
+    extensions = tuple(args.extensions) + tuple(args.fixed_form_extensions)
+    assert not [filename for filename in args.filenames if filename.endswith(extensions)], argv
+    assert check_indentation.main(argv) == 0, argv
+    assert capsys.readouterr() == ('', ''), argv
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+
+
+@pytest.mark.parametrize('argv', CASES, ids=' '.join)
+def test_nothing_to_check_agrees_with_parser(argv, capsys):
+    if hook.nothing_to_check(argv):
+        _assert_nothing_checked(argv, capsys)
+
+def test_nothing_to_check_agrees_with_parser_on_random_arguments(capsys):
+    for argv in _random_cases(2000):
+        if hook.nothing_to_check(argv):
+            _assert_nothing_checked(argv, capsys)
+
+def test_nothing_to_check_without_fortran_files():
+    assert hook.nothing_to_check([])
+    assert hook.nothing_to_check(['README.md', 'setup.cfg'])
+    assert hook.nothing_to_check(['--line-length', '100', '--autofix', 'a.txt'])
+    assert hook.nothing_to_check(['--extensions', '.F90', 'a.f90'])
+
+def test_fortran_files_are_checked():
+    assert not hook.nothing_to_check(['a.f90'])
+    assert not hook.nothing_to_check(['README.md', 'a.F'])
+    assert not hook.nothing_to_check(['a.txt', '--extensions', '.txt'])
+
+def test_parser_defaults_match_hook():
+    args = check_indentation._argument_parser().parse_args([])
+    assert tuple(args.extensions) == hook.FREE_FORM_EXTENSIONS
+    assert tuple(args.fixed_form_extensions) == hook.FIXED_FORM_EXTENSIONS
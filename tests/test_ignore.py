@@ -0,0 +1,39 @@
+import re
+
+import pytest
+
+from fortran_format_hooks.check_indentation import _pattern_matcher
+
+## The combined ignore pattern matcher must return what trying each pattern in turn would: the first pattern a
+##  filename matches.
+
+
+PATTERN_LISTS = [
+    [],
+    ['build/.*'],
+    ['.*_gen\\.f90', 'src/old/.*'],
+    ['(a)x', r'(b)\1'],
+    [r'(?P<dir>\w+)/(?P=dir)\.f90', '.*\\.F90'],
+    [r'(x)?(?(1)y|z)\.f90', 'z.*'],
+    ['(?i)TEST_.*', 'test_a.*'],
+    ['(?P<n>a)', '(?P<n>b)'],
+    ['a.*', '(a)b.*', 'ab.*'],
+]
+FILENAMES = [
+    'bb', 'ax', 'ab', 'abc', 'a', 'b', 'src/src.f90', 'src/lib.f90', 'x.F90', 'xy.f90', 'z.f90', 'zz', 'TEST_x',
+    'test_a.f90', 'build/a.f90', 'lib_gen.f90', 'src/old/a.f90', '',
+]
+
+
+def _first_match(patterns, filename):
+    return next((pattern for pattern in patterns if re.match(pattern, filename)), None)
+
+
+@pytest.mark.parametrize('patterns', PATTERN_LISTS, ids=repr)
+def test_matches_each_pattern_in_turn(patterns):
+    matching_pattern = _pattern_matcher(patterns)
+    for filename in FILENAMES:
+        assert matching_pattern(filename) == _first_match(patterns, filename), filename
+
+def test_backreference():
+    assert _pattern_matcher(['(a)x', r'(b)\1'])('bb') == r'(b)\1'
@@ -0,0 +1,90 @@
+from fortran_format_hooks import check_indentation
+
+## Each branch of a preprocessor conditional is checked from the state at the start of the conditional, and the
+##  check carries on after it from the state at the end of the first branch, so alternative headers and openings
+##  of the same block each pass, and the lines after the conditional are indented inside the block they open.
+
+
+def _check(tmp_path, source):
+    path = tmp_path / 'source.F90'
+    path.write_text(source)
+    diagnostics = []
+    corrected = []
+    (success, complete), _ = check_indentation._drain(
+        check_indentation.iter_corrected_lines(str(path), diagnostics=diagnostics), corrected.append
+    )
+    assert complete
+    return success, [(diagnostic.line_num, diagnostic.expected, diagnostic.found) for diagnostic in diagnostics], \
+        "".join(corrected)
+
+
+ALTERNATIVE_HEADERS = (
+    "module m\n"
+    "  implicit none\n"
+    "contains\n"
+    "#ifdef DOUBLE\n"
+    "  subroutine s(x, n)\n"
+    "    real(8) :: x\n"
+    "#elif defined(QUAD)\n"
+    "  subroutine s(x, n)\n"
+    "    real(16) :: x\n"
+    "#else\n"
+    "  subroutine s(x, n)\n"
+    "    real :: x\n"
+    "#endif\n"
+    "    integer :: n, i\n"
+    "#if defined(CONCURRENT)\n"
+    "    do concurrent (i = 1:n)\n"
+    "#else\n"
+    "    do i = 1, n\n"
+    "#endif\n"
+    "       x = x + 1\n"
+    "#ifndef QUIET\n"
+    "       print *, x\n"
+    "#endif\n"
+    "    end do\n"
+    "  end subroutine s\n"
+    "end module m\n"
+)
+
+
+def test_alternative_headers_pass(tmp_path):
+    assert _check(tmp_path, ALTERNATIVE_HEADERS) == (True, [], ALTERNATIVE_HEADERS)
+
+def test_each_branch_is_checked(tmp_path):
+    source = ALTERNATIVE_HEADERS.replace("    real(16) :: x\n", "  real(16) :: x\n").replace(
+        "    real :: x\n", "      real :: x\n"
+    )
+    assert _check(tmp_path, source) == (False, [(9, 4, 2), (12, 4, 6)], ALTERNATIVE_HEADERS)
+
+def test_lines_after_conditional_follow_first_branch(tmp_path):
+    source = ALTERNATIVE_HEADERS.replace("       x = x + 1\n", "    x = x + 1\n")
+    assert _check(tmp_path, source) == (False, [(20, 7, 4)], ALTERNATIVE_HEADERS)
+
+def test_nested_conditionals(tmp_path):
+    source = (
+        "program p\n"
+        "  implicit none\n"
+        "#if defined(A)\n"
+        "#ifdef B\n"
+        "  do\n"
+        "#elif defined(C)\n"
+        "  do while (.true.)\n"
+        "#endif\n"
+        "     exit\n"
+        "  end do\n"
+        "#endif\n"
+        "end program p\n"
+    )
+    assert _check(tmp_path, source) == (True, [], source)
+
+def test_unmatched_directives_are_ignored(tmp_path):
+    source = (
+        "program p\n"
+        "#endif\n"
+        "  implicit none\n"
+        "#else\n"
+        "  print *, 1\n"
+        "end program p\n"
+    )
+    assert _check(tmp_path, source) == (True, [], source)
@@ -0,0 +1,98 @@
+import json
+
+from fortran_format_hooks import check_indentation
+from fortran_format_hooks.scopes import ScopeIndex, write_sidecar
+
+## A scope index read back from its binary form must list the same scopes as the index written, as must the
+##  JSON sidecar.
+
+
+SOURCE = (
+    "module geometry\n"
+    "  implicit none\n"
+    "  type :: point\n"
+    "     real :: x, y\n"
+    "  end type point\n"
+    "  interface norm\n"
+    "     module procedure norm_point\n"
+    "  end interface norm\n"
+    "contains\n"
+    "  function norm_point(p) result(n)\n"
+    "    type(point), intent(in) :: p\n"
+    "    real :: n\n"
+    "    n = sqrt(p%x**2 + p%y**2)\n"
+    "  end function norm_point\n"
+    "  subroutine scale(points, factor)\n"
+    "    type(point), intent(inout) :: points(:)\n"
+    "    real, intent(in) :: factor\n"
+    "    integer :: i\n"
+    "    outer: do i = 1, size(points)\n"
+    "       if (factor > 0) then\n"
+    "          points(i)%x = factor*points(i)%x\n"
+    "       end if\n"
+    "    end do outer\n"
+    "    associate (längen => points%y)\n"
+    "    end associate\n"
+    "  end subroutine scale\n"
+    "end module geometry\n"
+    "program main\n"
+    "  use geometry\n"
+    "  block\n"
+    "  end block\n"
+    "end program main\n"
+)
+
+
+def _index(tmp_path):
+    path = tmp_path / 'geometry.f90'
+    path.write_text(SOURCE, encoding='UTF-8')
+    index = ScopeIndex()
+    result, _ = check_indentation._drain(check_indentation.iter_corrected_lines(str(path), scopes=index))
+    assert result[0], "the source must pass the check"
+    return index, str(path)
+
+
+def test_binary_round_trip(tmp_path):
+    index, _ = _index(tmp_path)
+    scopes = index.as_list()
+    assert [(scope['kind'], scope['name']) for scope in scopes][:4] == [
+        ('module', 'geometry'), ('type', 'point'), ('interface', 'norm'), ('function', 'norm_point'),
+    ]
+    assert ('do', 'outer') in [(scope['kind'], scope['name']) for scope in scopes]
+
+    data = index.to_bytes()
+    read = ScopeIndex.from_bytes(data)
+    assert read.as_list() == scopes
+    assert read.to_bytes() == data
+
+def test_sidecars_round_trip(tmp_path):
+    index, filename = _index(tmp_path)
+    with open(write_sidecar(index, filename, 'binary'), 'rb') as f:
+        assert ScopeIndex.from_bytes(f.read()).as_list() == index.as_list()
+    with open(write_sidecar(index, filename, 'json'), encoding='UTF-8') as f:
+        assert json.load(f) == index.as_list()
+
+def test_empty_round_trip():
+    assert ScopeIndex.from_bytes(ScopeIndex().to_bytes()).as_list() == []
+
+## a bare END closes whichever procedure it ends, so the procedures after a function are not nested in it
+def test_fixed_form_bare_end(tmp_path):
+    path = tmp_path / 'procedures.f'
+    path.write_text(
+        "      FUNCTION F(X)\n"
+        "        F = X\n"
+        "      END\n"
+        "      SUBROUTINE S\n"
+        "        CALL G\n"
+        "      END\n"
+        "      PROGRAM P\n"
+        "        CALL S\n"
+        "      END\n"
+    )
+    index = ScopeIndex()
+    result, _ = check_indentation._drain(check_indentation.iter_corrected_lines(str(path), fixed_form=True, scopes=index))
+    assert result[0]
+    assert [(scope['kind'], scope['name'], scope['start'], scope['end'], scope['depth']) for scope in index.as_list()] == [
+        ('function', 'F', 1, 3, 0), ('subroutine', 'S', 4, 6, 0), ('program', 'P', 7, 9, 0),
+    ]
+    assert ScopeIndex.from_bytes(index.to_bytes()).as_list() == index.as_list()
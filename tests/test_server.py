@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from fortran_format_hooks.server import Document
+
+## After any sequence of edits, the results of a document, checked again only from the checkpoint before each
+##  edit, must be those of a document holding the same text checked from scratch.
+
+
+SOURCE = (
+    "module m\n"
+    "  implicit none\n"
+    "contains\n"
+    "  subroutine s(x, n)\n"
+    "    real :: x\n"
+    "    integer :: n, i\n"
+    "    do i = 1, n\n"
+    "       if (x > 0) then\n"
+    "          x = x - 1\n"
+    "       else\n"
+    "          x = x + 1\n"
+    "       end if\n"
+    "    end do\n"
+    "  end subroutine s\n"
+    "  function f(y) result(z)\n"
+    "    real :: y, z\n"
+    "    z = 2*y + &\n"
+    "         1\n"
+    "  end function f\n"
+    "end module m\n"
+)
+
+# Lines random edits insert, opening and closing scopes so the state after an edit may or may not match
+SNIPPETS = [
+    "do i = 1, 3\n", "end do\n", "if (x > 0) then\n", "else\n", "end if\n", "x = 1\n", "   x = 2\n", "\n",
+    "! comment\n", "subroutine t\n", "end subroutine t\n", "select case (n)\n", "case (1)\n", "end select\n",
+    "y = 1 + &\n", "  2\n", "program p\n", "end program p\n", "associate (a => x)\n", "end associate\n",
+]
+
+
+def _results(document):
+    return [
+        (corrected, [diagnostic.as_dict() for diagnostic in diagnostics])
+        for corrected, diagnostics in document.results
+    ]
+
+
+# A random edit between two valid positions, the end no earlier than the start
+def _random_edit(generator, document):
+    lines = document.lines
+    ## past the last line is a valid position only if that line ends with a newline
+    last_line = len(lines) if not lines or lines[-1].endswith('\n') else len(lines) - 1
+    start_line = generator.randint(0, last_line)
+    end_line = min(last_line, start_line + generator.choice((0, 0, 1, 2, 5)))
+    start_length = len(lines[start_line].rstrip('\n')) if start_line < len(lines) else 0
+    end_length = len(lines[end_line].rstrip('\n')) if end_line < len(lines) else 0
+    start_character = generator.randint(0, start_length)
+    end_character = generator.randint(start_character if end_line == start_line else 0, end_length)
+    if generator.random() < 0.3:
+        text = generator.choice(("", " ", "  ", "x"))
+    else:
+        text = "".join(generator.choice(SNIPPETS) for _ in range(generator.randint(1, 4)))
+    document.edit((start_line, start_character), (end_line, end_character), text)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_edits_match_fresh_check(seed):
+    generator = random.Random(seed)
+    document = Document(SOURCE * 3, interval=4)
+    for _ in range(40):
+        _random_edit(generator, document)
+        fresh = Document("".join(document.lines), interval=4)
+        assert _results(document) == _results(fresh)
+        assert document.formatting_edits == fresh.formatting_edits
+
+def test_replace_matches_fresh_check():
+    document = Document(SOURCE, interval=2)
+    document.replace(SOURCE.replace("    do i = 1, n\n", "    do i = 1, n\n  do\n", 1))
+    fresh = Document("".join(document.lines), interval=2)
+    assert _results(document) == _results(fresh)
+    assert [diagnostic.as_dict() for diagnostic in document.diagnostics] == [
+        diagnostic.as_dict() for diagnostic in fresh.diagnostics
+    ]
@@ -0,0 +1,57 @@
+import os
+import random
+import hashlib
+
+import pytest
+
+from fortran_format_hooks.source import SourceLines
+
+## However they are read, in order, out of order or both at once, the lines of a file are those read in text mode,
+##  and a file truncated while it is read just ends early.
+
+
+PIECES = ["a\n", "bb\n", "\n", "é\n", "  x = 1 ! ü\n", "y" * 70 + "\n"]
+
+
+def _lines(path):
+    with open(path, 'r', encoding='UTF-8') as f:
+        return f.readlines()
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_lines_match_text_mode(tmp_path, seed):
+    generator = random.Random(seed)
+    text = "".join(generator.choice(PIECES) for _ in range(generator.randint(0, 60)))
+    text += generator.choice(("", "last line", "\r\n", "\rold mac\r"))
+    path = tmp_path / 'source.f90'
+    path.write_bytes(text.encode())
+    expected = _lines(path)
+
+    with SourceLines(str(path)) as lines:
+        assert list(lines) == expected
+        assert len(lines) == len(expected)
+        assert [lines[index] for index in range(len(expected))] == expected
+        ## lines read out of order in the middle of reading a range do not disturb it
+        read = []
+        for line in lines.range(0, len(expected)):
+            read.append(line)
+            if expected:
+                lines[generator.randrange(len(expected))]
+        assert read == expected
+        start, stop = sorted(generator.randint(0, len(expected)) for _ in range(2))
+        assert list(lines.range(start, stop)) == expected[start:stop]
+        line_nums = sorted({generator.randint(1, len(expected) + 1) for _ in range(5)})
+        assert lines.prefix_digests(line_nums) == [
+            hashlib.blake2b("".join(expected[:line_num - 1]).encode(), digest_size=16).hexdigest()
+            for line_num in line_nums
+        ]
+
+def test_truncated_while_read(tmp_path):
+    path = tmp_path / 'source.f90'
+    path.write_text("    x = 1\n" * 10000)
+    with SourceLines(str(path)) as lines:
+        assert len(lines) == 10000
+        os.truncate(path, 95)
+        assert list(lines.range(0, 10000)) == ["    x = 1\n"] * 9 + ["    x"]
+        assert lines[5000] == ""
+        assert len(lines.prefix_digests([1, 5000])) == 2
@@ -0,0 +1,64 @@
+import sys
+import errno
+import ctypes
+
+import pytest
+
+from fortran_format_hooks import watch
+
+## A directory inotify cannot watch as it runs out of watches must not go unwatched silently: the watch falls back
+##  to polling, with a warning, whereas directories that cannot be watched for themselves are just left out.
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason="needs inotify")
+
+
+# The C library, but with inotify_add_watch failing with an error
+class _FailingLibc:
+    def __init__(self, libc, error):
+        self.inotify_init1 = libc.inotify_init1
+        self.inotify_add_watch = _FailingAddWatch(error)
+
+class _FailingAddWatch:
+    def __init__(self, error):
+        self.error = error
+
+    def __call__(self, fd, path, mask):
+        ctypes.set_errno(self.error)
+        return -1
+
+@pytest.fixture
+def failing_watches(monkeypatch):
+    def fail_with(error):
+        cdll = ctypes.CDLL
+        monkeypatch.setattr(watch.ctypes, 'CDLL', lambda *args, **kwargs: _FailingLibc(cdll(*args, **kwargs), error))
+    return fail_with
+
+
+def test_out_of_watches_falls_back_to_polling(tmp_path, failing_watches, capsys):
+    failing_watches(errno.ENOSPC)
+    watcher = watch.open_watcher([str(tmp_path)], [], lambda directory: True, lambda: [])
+    assert isinstance(watcher, watch.PollingWatcher)
+    assert "fs.inotify.max_user_watches" in capsys.readouterr().err
+
+def test_unwatchable_directory_is_left_out(tmp_path, failing_watches, capsys):
+    failing_watches(errno.ENOENT)
+    watcher = watch.open_watcher([str(tmp_path)], [], lambda directory: True, lambda: [])
+    try:
+        assert isinstance(watcher, watch.InotifyWatcher)
+    finally:
+        watcher.close()
+    assert capsys.readouterr().err == ""
+
+def test_changes_are_seen(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    watcher = watch.open_watcher([str(tmp_path)], [], lambda directory: True, lambda: [])
+    try:
+        (tmp_path / 'sub' / 'a.f90').write_text("program p\nend program p\n")
+        changed = set()
+        for _ in range(20):
+            changed |= watcher.wait(0.1)
+            if changed:
+                break
+        assert str(tmp_path / 'sub' / 'a.f90') in changed
+    finally:
+        watcher.close()